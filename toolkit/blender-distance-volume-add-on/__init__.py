@@ -12,12 +12,11 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import json
-import bpy, bmesh, time, sys, functools, numpy, types, copy
+import bpy, bmesh, collections, numpy, threading, traceback, types, zlib
 from mathutils.bvhtree import BVHTree
 from bpy.props import PointerProperty
 from bpy.types import Operator
 from mathutils import Vector
-from mathutils.geometry import barycentric_transform, intersect_point_tri_2d, intersect_point_line
 
 # import subprocess
 # import ensurepip
@@ -31,8 +30,45 @@ import os
 # subprocess.check_call([pybin, '-m', 'pip', 'uninstall', 'PIL', '-y'])
 # subprocess.check_call([pybin, '-m', 'pip', 'install', 'image'])
 
-from PIL import Image
-
+from . distancevolume import (
+    BakeCancelled,
+    BakeProfile,
+    CONTAINER_NAME,
+    WorkerPool,
+    bake_distance_volumes,
+    build_mip_chain,
+    calculate_cached_occlusion,
+    calculate_dimensions,
+    calculate_occlusion,
+    create_distances,
+    find_cells_near_triangles,
+    get_bake_settings,
+    get_cell,
+    get_geometry_hash,
+    get_mip_name,
+    get_step_widths,
+    get_quantized_files,
+    get_sensor_inputs,
+    get_cached_texel_positions,
+    get_texel_distances,
+    get_worker_count,
+    is_up_to_date,
+    load_container,
+    load_manifest,
+    load_quantization,
+    pad_sensor_positions,
+    propagate,
+    propagate_nearest,
+    quantize_distances,
+    save_container,
+    save_image,
+    save_manifest,
+    save_nearest_textures,
+    save_quantization,
+    save_quantized_texture,
+    save_texture
+)
+from . preview import store_preview_bake, store_preview_volume, update_preview
 from . panel import DistanceBakePanel
 from . propertyGroup import DistanceBakePropertyGroup
 
@@ -47,16 +83,6 @@ bl_info = {
     "category" : "Generic"
 }
 
-def save_image(filepath, filetype, data, width, height):
-    # Similar to webgl-operate’s encode_uint32_to_rgba8 function
-    low_bits = numpy.bitwise_and(numpy.right_shift(numpy.asarray(data, numpy.uint16()).flatten(), 0), 0xFF)
-    high_bits = numpy.bitwise_and(numpy.right_shift(numpy.asarray(data, numpy.uint16()).flatten(), 8), 0xFF)
-    low_image = Image.frombytes('L', (width, height), numpy.asarray(low_bits, numpy.uint8(), order = 'C'))
-    high_image = Image.frombytes('L', (width, height), numpy.asarray(high_bits, numpy.uint8(), order = 'C'))
-    low_image.save("{0}_low.{1}".format(filepath, filetype))
-    high_image.save("{0}_high.{1}".format(filepath, filetype))
-
-
 class exportSensorLabellingPositions(bpy.types.Operator):
     bl_idname = "render.export_sensor_labelling_positions"
     bl_label = "Export sensor labelling positions"
@@ -122,178 +148,78 @@ class bakeDistanceTest(bpy.types.Operator):
         print("done")
         return {"FINISHED"}
 
-progressStartTime = 0
-timeLeft = 0
-progress_goal = 1
-def update_progress(job_title, step):
-    global progressStartTime
-    global timeLeft
-    progress = step / progress_goal
-    now = time.time()
-    if progressStartTime == 0:
-        progressStartTime = now
-    if progress != 0:
-        timeLeft = (1 - progress) * (now - progressStartTime) / progress
-    length = 20
-    block = int(round(length*progress))
-    msg = "\r{0}: [{1}] {2:.1f}% {3}s".format(job_title, "#"*block + "-"*(length-block), round(progress*100, 1), round(timeLeft))
-    if progress >= progress_goal:
-        msg += " DONE\r\n"
-        progressStartTime = 0
-        timeLeft = 0
-    sys.stdout.write(msg)
-    sys.stdout.flush()
-
-def get_bounds(points):
-    minimum = points[0].copy()
-    maximum = points[0].copy()
-
-    for point in points:
-        minimum.x = min(minimum.x, point.x)
-        minimum.y = min(minimum.y, point.y)
-        maximum.x = max(maximum.x, point.x)
-        maximum.y = max(maximum.y, point.y)
-    return (minimum, maximum)
-
-def to_pixel_space(point, image):
-    point.x *= image.size[0]
-    point.y *= image.size[1]
-
-def in_pixel_space(point, image):
-    new_point = point.copy()
-    new_point.x *= image.size[0]
-    new_point.y *= image.size[1]
-    return new_point
-
-def to_normalized_space(point, image):
-    point.x /= image.size[0]
-    point.y /= image.size[1]
-    return point
-
-def set_pixel(pixels, width, height, x, y, r, g, b, a = 255):
-    pixelNumber = (y * width + x) * 4
-    pixels[pixelNumber + 0] = r
-    pixels[pixelNumber + 1] = g
-    pixels[pixelNumber + 2] = b
-    pixels[pixelNumber + 3] = a
-
-def get_pixel(pixels, width, height, x, y):
-    pixelNumber = (y * width + x) * 4
-    return (
-        pixels[pixelNumber + 0],
-        pixels[pixelNumber + 1],
-        pixels[pixelNumber + 2],
-        pixels[pixelNumber + 3]
-    )
-
-def pixel_is_empty(pixels, width, height, x, y):
-    r, g, b, a = get_pixel(pixels, width, height, x, y)
-    return r == 0
-
-def clear_image(pixels, width, height):
-    for y in range(0, height):
-        for x in range(0, width):
-            pixelNumber = (y * width + x) * 4
-            pixels[pixelNumber + 0] = 0
-            pixels[pixelNumber + 1] = 0
-            pixels[pixelNumber + 2] = 0
-            pixels[pixelNumber + 3] = 255
-
-def find_coord(loc, face, uv_map, obj):
-    u, v, w = [l[uv_map].uv.to_3d() for l in face.loops]
-    x, y, z = [v.co for v in face.verts]
-    co = barycentric_transform(loc, u, v, w, x, y, z)
-    return obj.matrix_world @ co
-
-def find_distance(point_a, point_b):
-    connection = point_a - point_b
-    distance = connection.length * 0.5
-    return distance
-
-def bake_distances(context, obj, mesh, uv_map, texture, point):
-    margin = context.scene.distance_bake.margin
-    pixels = list(texture.pixels)
+def copy_settings(settings):
+    """Returns a copy of the bake settings, so that a bake running in the background is not affected by later changes in
+    the panel
+    """
+    return types.SimpleNamespace(**{key: getattr(settings, key) for key in DistanceBakePropertyGroup.__annotations__})
+
+def get_file_sizes(filepaths):
+    return sum(os.path.getsize(filepath) for filepath in filepaths if os.path.isfile(filepath))
+
+def get_triangles(mesh):
+    return numpy.array([[loop.vert.co[:] for loop in triangle] for triangle in mesh.calc_loop_triangles()], dtype=numpy.float64).reshape(-1, 3, 3)
+
+def get_vertices(mesh):
+    return numpy.array([vertex.co[:] for vertex in mesh.verts], dtype=numpy.float64).reshape(-1, 3)
+
+def get_find_nearest(mesh):
+    bvh = BVHTree.FromBMesh(mesh, epsilon=0.0)
+    def find_nearest(world_points):
+        points = numpy.empty((len(world_points), 3))
+        normals = numpy.empty((len(world_points), 3))
+        for index, world_point in enumerate(world_points):
+            point, normal, _, _ = bvh.find_nearest(Vector(world_point))
+            points[index] = point
+            normals[index] = normal
+        return points, normals
+    return find_nearest
+
+def get_uv_triangles(obj, uv_layer):
+    """Returns the UV coordinates (n, 3, 2) and world positions (n, 3, 3) of the corners of the object’s triangles"""
+    mesh = obj.data
+    mesh.calc_loop_triangles()
+    loops = numpy.empty(len(mesh.loop_triangles) * 3, dtype=numpy.int32)
+    mesh.loop_triangles.foreach_get("loops", loops)
+    uvs = numpy.empty(len(mesh.loops) * 2, dtype=numpy.float32)
+    uv_layer.data.foreach_get("uv", uvs)
+    vertex_indices = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+    mesh.loops.foreach_get("vertex_index", vertex_indices)
+    coordinates = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get("co", coordinates)
+
+    matrix_world = numpy.array(obj.matrix_world, dtype=numpy.float64)
+    positions = coordinates.reshape(-1, 3) @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+    return uvs.reshape(-1, 2)[loops].reshape(-1, 3, 2), positions[vertex_indices[loops]].reshape(-1, 3, 3)
+
+def get_sensor_image(texture, name):
+    """Returns the image called name, created (or scaled) with the size of the texture if necessary"""
     width = texture.size[0]
     height = texture.size[1]
-    clear_image(pixels, width, height)
-    update_progress("bake distance for " + obj.name, 0)
-    for face_index, face in enumerate(mesh.faces):
-        update_progress("bake distance for " + obj.name, face_index / len(mesh.faces))
-        points = [l[uv_map].uv.to_3d() for l in face.loops]
-        u, v, w = points
-        minimum, maximum = get_bounds(points)
-        to_pixel_space(minimum, texture)
-        to_pixel_space(maximum, texture)
-        for y in range(round(minimum.y - margin), round(maximum.y + margin)):
-            for x in range(round(minimum.x - margin), round(maximum.x + margin)):
-                point_on_triange = to_normalized_space(Vector((x, y, 0)), texture)
-                if intersect_point_tri_2d(point_on_triange, u, v, w):
-                    point_in_world = find_coord(point_on_triange, face, uv_map, obj)
-                    distance = find_distance(point_in_world, point)
-                    set_pixel(pixels, width, height, x, y, distance, distance, distance)
-                else:
-                    if not pixel_is_empty(pixels, width, height, x, y):
-                        continue
-                    distance_to_triangle = margin + 1
-                    closest_point = ()
-                    for index in range(0, len(points)):
-                        p0 = points[index]
-                        p1 = points[(index+1) % len(points)]
-                        closest_point_local, _ = intersect_point_line(point_on_triange, p0, p1)
-                        distance_to_triangle_local = find_distance(
-                            in_pixel_space(closest_point_local, texture), 
-                            in_pixel_space(point_on_triange, texture)
-                        )
-                        if distance_to_triangle_local < distance_to_triangle:
-                            distance_to_triangle = distance_to_triangle_local
-                            closest_point = closest_point_local
-                    
-                    if distance_to_triangle <= margin:
-                        point_in_world = find_coord(closest_point, face, uv_map, obj)
-                        distance = find_distance(point_in_world, point)
-                        set_pixel(pixels, width, height, x, y, distance, distance, distance)
-                    
-    update_progress("bake distance for " + obj.name, 1)
-    texture.pixels = pixels
+    image = bpy.data.images.get(name)
+    if image is None:
+        image = bpy.data.images.new(name, width, height, float_buffer=True, is_data=True)
+    elif image.size[0] != width or image.size[1] != height:
+        image.scale(width, height)
+    return image
+
+def bake_distances(image, texel_positions, covered, points, stage, packed = False):
+    """Writes the (halved) distances of the texels to a single point into the RGB channels of the image, or, if packed,
+    to up to four points into its RGBA channels
+    """
+    height, width = covered.shape
+    pixels = numpy.zeros((height, width, 4), dtype=numpy.float32)
+    if not packed:
+        # Empty texels stay black (with an alpha of 255, as before)
+        pixels[..., 3] = 255
+        pixels[..., :3] = get_texel_distances(texel_positions, covered, points[0])[..., None] * 0.5
+    else:
+        for channel, point in enumerate(points):
+            pixels[..., channel] = get_texel_distances(texel_positions, covered, point) * 0.5
+    image.pixels.foreach_set(pixels.ravel())
+    stage.count("sensors", len(points))
+    stage.count("pixels_written", int(numpy.count_nonzero(covered)))
         
-filled_cells = 0
-def set_cell(cell, value, distances, cells_to_check):
-    if (cell[0] < 0 or cell[0] >= len(distances[0][0])
-        or cell[1] < 0 or cell[1] >= len(distances[0])
-        or cell[2] < 0 or cell[2] >= len(distances)):
-        return
-    x = cell[0]
-    y = cell[1]
-    z = cell[2]
-    current_value = distances[z][y][x]
-    if current_value == None:
-        distances[z][y][x] = value
-        cells_to_check.append(cell)
-        global filled_cells
-        filled_cells += 1
-        if filled_cells % 1024 == 0: update_progress("calculate distances", filled_cells)
-        return
-    if current_value == True or current_value < 0.0:
-        if current_value == True:
-            distances[z][y][x] = -1.0 * abs(value)
-            # cells_to_check.append(cell)
-        elif -1.0 * abs(value) > current_value:
-            distances[z][y][x] = -1.0 * abs(value)
-            # cells_to_check.append(cell)
-            # cells_to_check.append(cell)
-        # Explicitly don't do the following:
-        # cells_to_check.append(cell)
-        return
-    # if current_value == True:
-    #     distances[z][y][x] = value
-    #     # Explicitly don't do the following:
-    #     # cells_to_check.append(cell)
-    #     return
-    if value < current_value:
-        distances[z][y][x] = value
-        cells_to_check.append(cell)
-
-
 class bakeDistanceVolume(bpy.types.Operator):
     bl_idname = "render.volume_distance_bake"
     bl_label = "Bake Distance Volume"
@@ -302,48 +228,54 @@ class bakeDistanceVolume(bpy.types.Operator):
     resolution = []
     bounding_box = types.SimpleNamespace()
     occluded_cells = 0
-
-    def calculate_occlusion(self, mesh):
-        global progress_goal
-        resolution = self.resolution
-        bounding_box = self.bounding_box
-
-        # TODO: Calculate this threshold from the _max_ (or _min_/_mean_?) of [Δx, Δy, Δz] of the bbox instead of Δx alone here?
-        dist_treshold = ((bounding_box.max[0] - bounding_box.min[0]) / resolution[0])
-        # The distance threshold is half of the grid’s step size (half of the distance between two cell mid-points)
-        dist_treshold = dist_treshold / 2.0
-
-        bvh = BVHTree.FromBMesh(mesh, epsilon=0.0)
-        distances = [None] * resolution[2]
-        self.occluded_cells = 0
-        progress_goal = resolution[2] - 1
-        update_progress("calculate occlusion", 0)
-        for z in range(0, resolution[2]):
-            update_progress("calculate occlusion", z)
-            grid = [None] * resolution[1]
-            for y in range(0, resolution[1]):
-                row = [None] * resolution[0]
-                for x in range(0, resolution[0]):
-                    world_point = Vector([((float(val) + 0.5) / (resolution[i])) * (bounding_box.max[i]-bounding_box.min[i]) + bounding_box.min[i] for i, val in enumerate((x, y, z))])
-
-                    point, normal, _, dist = bvh.find_nearest(world_point)
-                    if self.settings.occlusion_methode == "MESH":
-                        if dist <= dist_treshold:
-                            self.occluded_cells += 1
-                            row[x] = True
-                    else:
-                        p2 = point - world_point
-                        v = p2.dot(normal)
-                        # TODO: Pay attention to special cases if the normal is not a face normal, but a vertex/edge normal
-                        # (see https://github.com/JacquesLucke/animation_nodes/issues/420)
-                        if v >= 0.0:
-                            self.occluded_cells += 1
-                            row[x] = True
-                grid[y] = row
-            distances[z] = grid
-        update_progress("calculate occlusion", progress_goal)
-        print()
-        return distances
+    container_volumes = None
+    container_outdated = False
+    quantizations = {}
+    profile = None
+    output_path = ""
+    occlusion_cache_path = None
+    cells = []
+    worker_pool = None
+    preview_bake = None
+    preview_volume = None
+    thread = None
+    timer = None
+    result = None
+    error = None
+
+    def calculate_occlusion(self, mesh, triangles = None):
+        if triangles is None:
+            triangles = get_triangles(mesh)
+        with self.profile.stage("calculate occlusion", goal=len(triangles)) as stage:
+            cache_path = self.occlusion_cache_path
+            cached = False
+            if cache_path is None:
+                state = calculate_occlusion(
+                    triangles, self.bounding_box, self.resolution, self.settings.occlusion_methode, get_find_nearest(mesh), stage.progress
+                )
+            else:
+                state, cached = calculate_cached_occlusion(
+                    cache_path, triangles, self.bounding_box, self.resolution, self.settings.occlusion_methode, get_find_nearest(mesh), stage.progress
+                )
+                if cached:
+                    print("loaded occlusion from cache " + cache_path)
+            self.occluded_cells = int(numpy.count_nonzero(state))
+            stage.count("triangles", len(triangles))
+            stage.count("cells", int(state.size))
+            stage.count("occluded_cells", self.occluded_cells)
+            stage.count("cache_hits", 1 if cached else 0)
+        return state
+
+    def get_occlusion_cache_path(self):
+        # The cache is stored next to the .blend file; unsaved files are not cached
+        if not self.settings.use_occlusion_cache or bpy.data.filepath == "":
+            return None
+        return bpy.path.abspath("//occlusion-cache")
+
+    def resolve_paths(self):
+        # bpy’s data must not be read by background bakes, so the paths are resolved before
+        self.output_path = bpy.path.abspath(self.settings.output_path)
+        self.occlusion_cache_path = self.get_occlusion_cache_path()
 
     def get_mesh(self, context):
         mesh = bmesh.new()
@@ -367,296 +299,229 @@ class bakeDistanceVolume(bpy.types.Operator):
             mesh.transform(active_object.matrix_world)
         return mesh
 
-    def create_texture(self):
-        resolution = self.resolution
-        image = bpy.data.images.new("VolumeTexture", resolution[0] * resolution[2], resolution[1], float_buffer=True, is_data=True)
-        self.settings.preview_texture = image.name
-        return image
-
-    def calculate_distances(self, sensor_position, distances):
-        resolution = self.resolution
-        bounding_box = self.bounding_box
-        step_widths = [((bounding_box.max[i] - bounding_box.min[i]) / resolution[i]) for i in range(0, 3)]
-        mean_step_width = sum(step_widths) / len(step_widths)
-        # Note the behaviour of int() in Python, i. e., that numbers get rounded down towards null (negative values: rounded up, positives values: rounded down)
-        # int(0.0 * 8) # right _at_ the bounding_box.min corner
-        # 0
-        # int(0.124 * 8) # right before the step from cell 0 to cell 1
-        # 0
-        # int(0.126 * 8) # right after the step from cell 0 to cell 1
-        # 1
-        # int(0.249 * 8) # right before the step from cell 1 to cell 2
-        # 1
-        # int(0.250 * 8) # right _at_ the step from cell 1 to cell 2
-        # 2
-        # int(0.251 * 8) # right after the step from cell 1 to cell 2
-        # 2
-        # int(0.874 * 8) # right before the step from cell 6 to cell 7 (last cell)
-        # 6
-        # int(0.876 * 8) # right after the step from cell 6 to cell 7 (last cell)
-        # 7
-        # int(0.999 * 8) # right before the bounding_box.max corner
-        # 7
-        # int(1.0 * 8) # right _at_ the bounding_box.max corner (Attention! This overflows the cells indices; thus, a min(resolution[i] - 1, …) is necessary!)
-        # 8
-        cell_of_sensor = [min(int((sensor_position[i] - bounding_box.min[i]) / (bounding_box.max[i]-bounding_box.min[i]) * (resolution[i])), resolution[i] - 1) for i in range(0, 3)]
-        cells_to_check = []
-        set_cell(cell_of_sensor, 0, distances, cells_to_check)        
-        self.calculate_distances_for_cells(cells_to_check, distances, mean_step_width)
-    
-
-    def calculate_distances_for_cells(self, cells_to_check, distances, mean_step_width):
-        resolution = self.resolution
-        empty_cells = resolution[0] * resolution[1] * resolution[2] - self.occluded_cells
-        if empty_cells > 0:
-            global progress_goal
-            progress_goal = resolution[0] * resolution[1] * resolution[2]
-            update_progress("calculate distances", 0)
-            global filled_cells
-            filled_cells = 0
-            while len(cells_to_check) > 0:
-                cell = cells_to_check.pop(0)
-                x = cell[0]
-                y = cell[1]
-                z = cell[2]
-                current_value = distances[z][y][x]
-                
-                direct_neighbours = [
-                    [x + 1, y, z], [x - 1, y, z],
-                    [x, y + 1, z], [x, y - 1, z],
-                    [x, y, z + 1], [x, y, z - 1]
-                ]
-                for cell in direct_neighbours:
-                    # set_cell(cell, current_value + 1 * mean_step_width, distances, cells_to_check)
-                    factor = 1.0
-                    if self.settings.flooding_directions == "DIAGONAL":
-                        # Factor taken from https://kyamagu.github.io/mexopencv/matlab/distanceTransform.html
-                        factor = 0.955
-                    if current_value >= 0.0:
-                        set_cell(cell, current_value + factor * mean_step_width, distances, cells_to_check)
-                    else:
-                        # Only propagate negative values (lying within walls) through walls! 
-                        if (cell[0] < 0 or cell[0] >= len(distances[0][0])
-                            or cell[1] < 0 or cell[1] >= len(distances[0])
-                            or cell[2] < 0 or cell[2] >= len(distances)):
-                            # Do nothing
-                            foo = 1
-                        else: 
-                            cell_value = distances[cell[2]][cell[1]][cell[0]]
-                            if cell_value == True or (cell_value != None and cell_value < 0.0):
-                                set_cell(cell, current_value - factor * mean_step_width, distances, cells_to_check)
-                
-                if self.settings.flooding_directions == "DIAGONAL" or self.settings.flooding_directions == "DIAGONAL_5":
-                    # Factors taken from https://kyamagu.github.io/mexopencv/matlab/distanceTransform.html
-                    # (Also see: Gunilla Borgefors. "Distance transformations in digital images". Computer vision, graphics, and image processing, 34(3):344-371, 1986.)
-                    l2_b_factor = 1.3693
-                    if self.settings.flooding_directions == "DIAGONAL_5":
-                        l2_b_factor = 1.4
-                    diagonal_neighbours = [
-                        [x + 1, y + 1, z], [x + 1, y - 1, z],
-                        [x + 1, y, z + 1], [x + 1, y, z - 1],
-                        [x - 1, y + 1, z], [x - 1, y - 1, z],
-                        [x - 1, y, z + 1], [x - 1, y, z - 1],
-                        [x, y + 1, z + 1], [x, y + 1, z - 1], # light blue in the MagicaVoxel sketch
-                        [x, y - 1, z + 1], [x, y - 1, z - 1], # light blue in the MagicaVoxel sketch
-                    ]
-                    for cell in diagonal_neighbours:
-                        # set_cell(cell, current_value + 1.414 * mean_step_width, distances, cells_to_check)
-                        # set_cell(cell, current_value + 1.3693 * mean_step_width, distances, cells_to_check)
-                        if current_value >= 1.0:
-                            set_cell(cell, current_value + l2_b_factor * mean_step_width, distances, cells_to_check)
-                        else:
-                            # Only propagate negative values (lying within walls) through walls! 
-                            if (cell[0] < 0 or cell[0] >= len(distances[0][0])
-                                or cell[1] < 0 or cell[1] >= len(distances[0])
-                                or cell[2] < 0 or cell[2] >= len(distances)):
-                                # Do nothing
-                                foo = 1
-                            else: 
-                                cell_value = distances[cell[2]][cell[1]][cell[0]]
-                                if cell_value == True or (cell_value != None and cell_value < 0.0):
-                                    set_cell(cell, current_value - l2_b_factor * mean_step_width, distances, cells_to_check)
-                
-                if self.settings.flooding_directions == "DIAGONAL_5":
-                    l2_c_factor = 2.1969
-                    next_neighbors = [
-                        [x + 2, y + 1, z], [x + 2, y - 1, z], # yellow
-                        [x + 1, y + 2, z], [x + 1, y - 2, z], # yellow
-                        [x - 1, y + 2, z], [x - 1, y - 2, z], # yellow
-                        [x - 2, y + 1, z], [x - 2, y - 1, z], # yellow
-                        [x - 2, y, z + 1], [x + 2, y, z + 1], # light yellow
-                        [x, y - 2, z + 1], [x, y + 2, z + 1], # light yellow
-                        [x - 1, y, z + 2], [x + 1, y, z + 2], # light yellow
-                        [x, y - 1, z + 2], [x, y + 1, z + 2], # light yellow
-                        [x - 2, y, z - 1], [x + 2, y, z - 1], # dark yellow
-                        [x, y - 2, z - 1], [x, y + 2, z - 1], # dark yellow
-                        [x - 1, y, z - 2], [x + 1, y, z - 2], # dark yellow
-                        [x, y - 1, z - 2], [x, y + 1, z - 2], # dark yellow
-                    ]
-                    for cell in next_neighbors:
-                        if current_value >= 1.0:
-                            set_cell(cell, current_value + l2_c_factor * mean_step_width, distances, cells_to_check)
-                        else:
-                            # Only propagate negative values (lying within walls) through walls! 
-                            if (cell[0] < 0 or cell[0] >= len(distances[0][0])
-                                or cell[1] < 0 or cell[1] >= len(distances[0])
-                                or cell[2] < 0 or cell[2] >= len(distances)):
-                                # Do nothing
-                                foo = 1
-                            else: 
-                                cell_value = distances[cell[2]][cell[1]][cell[0]]
-                                if cell_value == True or (cell_value != None and cell_value < 0.0):
-                                    set_cell(cell, current_value - l2_c_factor * mean_step_width, distances, cells_to_check)
-
-            update_progress("calculate distances", progress_goal)
-            print()
-
-
-    def generate_preview_texture(self, distances):
-        global progress_goal
-        resolution = self.resolution
+    def get_step_widths(self):
+        return get_step_widths(self.bounding_box, self.resolution)
 
-        progress_goal = resolution[2] - 1
-        update_progress("gen preview  texture", 0)
+    def get_cell(self, sensor_position):
+        return get_cell(sensor_position, self.bounding_box, self.resolution)
 
-        image_name = self.settings.preview_texture
-        if (image_name == ""):
-            image = self.create_texture()
+    def bake_sensors(self, state, cells, names):
+        """Yields (index, distances, state) for each sensor cell, either one after another or from a pool of worker processes"""
+        worker_count = get_worker_count(self.settings.bake_workers, len(cells))
+        if worker_count == 1:
+            job_title = "calculate distances"
+            goal = self.resolution[0] * self.resolution[1] * self.resolution[2] - self.occluded_cells
         else:
-            image = bpy.data.images[image_name]
-            if (image.size[0] != resolution[0] * resolution[2] or image.size[1] != resolution[1]):
-                image = self.create_texture()
-
-        pixels = list(image.pixels)
-        for z in range(0, resolution[2]):
-            update_progress("gen preview  texture", z)
-            for y in range(0, resolution[1]):
-                for x in range(0, resolution[0]):
-                    pixel_pos = (x + y * resolution[0] * resolution[2] + z * resolution[0]) * 4
-
-                    value = distances[z][y][x]
-                    if value == None or value == True:
-                        value = 150.0
-
-                    value /= 150.0
-                    
-                    pixels[pixel_pos + 0] = value
-                    pixels[pixel_pos + 1] = value
-                    pixels[pixel_pos + 2] = value
-                    pixels[pixel_pos + 3] = 1
-        image.pixels = pixels
-        update_progress("gen preview texture", progress_goal)
-        print()
-
-    def generate_texture(self, name, distances, visualize_occlusion = False):
-        global progress_goal
-        bounding_box = self.bounding_box
-        resolution = self.resolution
-
-        image_width = resolution[0] * resolution[2]
-        image_height = resolution[1]        
-        
-        progress_goal = resolution[2] - 1
-        update_progress("accumulate  texture", 0)
-        image_width = resolution[0] * resolution[2]
-        image_height = resolution[1]
-        data = [None] * resolution[0] * resolution[1] * resolution[2]
-
-        step_widths = [((bounding_box.max[i] - bounding_box.min[i]) / resolution[i]) for i in range(0, 3)]
-        mean_step_width = sum(step_widths) / len(step_widths)
-        bounding_box_dimensions = [(bounding_box.max[i] - bounding_box.min[i]) for i in range(0, 3)]
-        max_distance = max(bounding_box_dimensions)
-
-        for z in range(0, resolution[2]):
-            update_progress("accumulate  texture", z)
-            for y in range(0, resolution[1]):
-                for x in range(0, resolution[0]):
-                    data_pos = (x + (image_height - y - 1) * image_width + z * resolution[0])
-
-                    value = distances[z][y][x]
-                    if value == None or value == True:
-                        if visualize_occlusion:
-                            if value == None:
-                                value = max_distance
-                            else: 
-                                value = 0.0
-                        else:
-                            value = max_distance
-                    
-                    if value < 0.0:
-                        # Values within the occluded areas
-                        # value = abs(value) - 1.207
-                        value = abs(value)
-                    
-                    if value > max_distance:
-                        value = max_distance
+            # The stages measure the time spent waiting for the next sensor of the pool; the progress counts the sensors
+            job_title = "calculate distances ({0} workers)".format(worker_count)
+            goal = len(cells)
+
+        stage = None
+        def progress(filled_cells):
+            stage.progress(filled_cells)
+
+        results = iter(bake_distance_volumes(
+            state, cells, self.get_step_widths(),
+            self.settings.flooding_directions, self.settings.propagation_methode, worker_count, progress if worker_count == 1 else None,
+            self.worker_pool
+        ))
+        for job in range(0, len(cells)):
+            with self.profile.stage(job_title, names[job] if worker_count == 1 else None, goal) as stage:
+                if worker_count > 1:
+                    stage.progress(job)
+                index, distances, sensor_state, counters, seconds = next(results)
+                stage.sensor = names[index]
+                if worker_count > 1:
+                    stage.progress(job + 1)
+                else:
+                    stage.add_counters(counters)
+            if worker_count > 1:
+                # The workers’ own time and counters, as if they had been baked one after another
+                self.profile.record("calculate distances", names[index], seconds, counters)
+            yield index, distances, sensor_state
 
-                    value /= max_distance
-                    data[data_pos] = value * 65535
-        filepath = bpy.path.abspath("//" + name)
-        save_image(filepath, 'png', data, resolution[0] * resolution[2], resolution[1])
+    def calculate_distances_for_cells(self, cells_to_check, distances, state, step_widths, name):
+        resolution = self.resolution
+        empty_cells = resolution[0] * resolution[1] * resolution[2] - self.occluded_cells
+        if empty_cells > 0:
+            with self.profile.stage("calculate distances", name, empty_cells) as stage:
+                counters = propagate(
+                    distances, state, cells_to_check,
+                    self.settings.flooding_directions, self.settings.propagation_methode, step_widths, stage.progress
+                )
+                stage.count("seed_cells", len(cells_to_check))
+                stage.add_counters(counters)
+
+
+    def generate_preview_texture(self, name, distances, state):
+        # The image is only updated by update_preview_texture, since Blender’s data must not be changed by background bakes
+        self.preview_volume = (name, distances, state)
+
+    def update_preview_texture(self):
+        if self.preview_volume is None:
+            return
+        with self.profile.stage("update preview texture") as stage:
+            if self.preview_bake is not None:
+                store_preview_bake(*self.preview_bake)
+            store_preview_volume(*self.preview_volume)
+            update_preview(self.settings)
+            stage.count("pixels", self.preview_volume[1].size)
+
+    def generate_texture(self, name, distances, state, visualize_occlusion = False):
+        with self.profile.stage("write texture", name) as stage:
+            filepath = os.path.join(self.output_path, name)
+            save_texture(filepath, distances, state, self.bounding_box, visualize_occlusion)
+            stage.count("bytes_written", get_file_sizes(["{0}_low.png".format(filepath), "{0}_high.png".format(filepath)]))
+
+    def bake_nearest(self, mesh, triangles, names, cells):
+        """Floods from all sensors at once and exports the nearest sensors’ indices and distances as packed textures"""
+        state = self.calculate_occlusion(mesh, triangles)
+
+        free_cells = self.resolution[0] * self.resolution[1] * self.resolution[2] - self.occluded_cells
+        with self.profile.stage("calculate nearest sensors", goal=free_cells) as stage:
+            nearest_distances, nearest_sensors, state, counters = propagate_nearest(
+                state, cells, self.settings.nearest_sensor_count,
+                self.settings.flooding_directions, self.get_step_widths(), stage.progress
+            )
+            stage.count("sensors", len(cells))
+            stage.add_counters(counters)
+
+        if self.should_output("PREVIEW"):
+            # The nearest sensors’ volume is the only one that can be previewed
+            self.preview_bake = (state, {}, self.get_step_widths(), self.settings.flooding_directions, self.settings.propagation_methode)
+            self.generate_preview_texture("nearest", nearest_distances[0], state)
+        if self.should_output("EXPORT"):
+            with self.profile.stage("write texture", "nearest") as stage:
+                filepath = os.path.join(self.output_path, "nearest")
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                save_nearest_textures(filepath, nearest_distances, nearest_sensors, self.bounding_box, names)
+                stage.count("bytes_written", get_file_sizes([filepath + suffix for suffix in ("_sensors.png", "_low.png", "_high.png", ".json")]))
+        return {"FINISHED"}
 
-        update_progress("accumulate  texture", progress_goal)
-        print()
+    def should_export_format(self, export_format):
+        return self.settings.export_format == "BOTH" or self.settings.export_format == export_format
+
+    def get_container_path(self):
+        return os.path.join(self.output_path, CONTAINER_NAME)
+
+    def load_container_volumes(self):
+        """Reads the volumes of the existing container, so that sensors that are not baked again are kept"""
+        self.container_volumes = collections.OrderedDict()
+        self.container_outdated = False
+        container_path = self.get_container_path()
+        if not os.path.isfile(container_path):
+            return
+        try:
+            header, volumes = load_container(container_path)
+        except (OSError, ValueError, KeyError, zlib.error):
+            print("ignoring unreadable container " + container_path)
+            return
+        if header["resolution"] == list(self.resolution) and header["boundingBox"]["min"] == list(self.bounding_box.min) and header["boundingBox"]["max"] == list(self.bounding_box.max):
+            self.container_volumes = volumes
+            # Volumes stored with other brick settings are written again, even if none of them changed
+            brick_size = self.settings.container_brick_size if self.settings.use_container_bricks else 0
+            self.container_outdated = any(entry.get("bricks", {}).get("size", 0) != brick_size for entry in header["volumes"])
+            for entry in header["volumes"]:
+                if "quantization" in entry and entry["name"] not in self.quantizations:
+                    self.quantizations[entry["name"]] = entry["quantization"]
+
+    def save_container_volumes(self):
+        with self.profile.stage("write container", goal=len(self.container_volumes)) as stage:
+            brick_size = self.settings.container_brick_size if self.settings.use_container_bricks else 0
+            save_container(
+                self.get_container_path(), self.container_volumes, self.bounding_box, quantizations=self.quantizations, brick_size=brick_size,
+                progress=stage.progress
+            )
+            stage.count("volumes", len(self.container_volumes))
+            stage.count("bytes_written", get_file_sizes([self.get_container_path()]))
+
+    def get_quantization_bits(self):
+        if self.settings.quantization == "BOUNDING_BOX":
+            return None
+        return int(self.settings.quantization.split("_")[1])
+
+    def get_quantization_settings(self):
+        # None for the bounding box normalization, so that the manifest entries of earlier bakes stay valid
+        bits = self.get_quantization_bits()
+        if bits is None:
+            return None
+        return [bits, self.settings.quantization_range]
+
+    def export_volume(self, name, distances, state):
+        # The progress counts the quantization, the texture, and each of its mip levels
+        with self.profile.stage("export volume", name, 2 + self.get_mip_levels()) as stage:
+            output_path = self.output_path
+            values, quantization = quantize_distances(
+                distances, state, self.bounding_box, self.get_quantization_bits(), self.settings.quantization_range
+            )
+            stage.progress(1)
+            if self.should_export_format("PNG"):
+                save_quantized_texture(os.path.join(output_path, name), values, quantization["bits"])
+                stage.progress(2)
+                self.export_mip_levels(name, distances, state, quantization, stage.progress)
+                files = get_quantized_files(name, self.get_quantization_bits(), self.get_mip_levels())
+                stage.count("bytes_written", get_file_sizes([os.path.join(output_path, filename) for filename in files]))
+            if self.should_export_format("CONTAINER"):
+                # The container keeps the rows in the textures’ (flipped) order
+                self.container_volumes[name] = values[:, ::-1]
+            self.quantizations[name] = quantization
+            save_quantization(output_path, self.quantizations)
+        print("{0}: {1} bits, max. quantization error {2:.4f} m".format(name, quantization["bits"], quantization["maxError"]))
+
+    def get_mip_levels(self):
+        return self.settings.mip_levels if self.should_export_format("PNG") else 0
+
+    def export_mip_levels(self, name, distances, state, quantization, progress):
+        # All levels share the volume’s quantized range, so that they decode the same way
+        output_path = self.output_path
+        bits = self.get_quantization_bits()
+        value_range = (quantization["offset"], quantization["maxDistance"]) if bits is not None else None
+        for level, (mip_distances, mip_state) in enumerate(build_mip_chain(distances, state, self.get_mip_levels()), 1):
+            mip_name = get_mip_name(name, level)
+            values, mip_quantization = quantize_distances(
+                mip_distances, mip_state, self.bounding_box, bits, self.settings.quantization_range, value_range=value_range
+            )
+            mip_quantization["resolution"] = [int(size) for size in mip_distances.shape[::-1]]
+            save_quantized_texture(os.path.join(output_path, mip_name), values, mip_quantization["bits"])
+            self.quantizations[mip_name] = mip_quantization
+            progress(2 + level)
 
     def calculate_dimensions(self, mesh):
-        self.bounding_box.min = [float("inf")] * 3
-        self.bounding_box.max = [float("-inf")] * 3
-        bounding_box = self.bounding_box
-        for vertex in mesh.verts:
-            for i in range(0, 3):
-                bounding_box.min[i] = min(bounding_box.min[i], vertex.co[i])
-                bounding_box.max[i] = max(bounding_box.max[i], vertex.co[i])                
-        dimensions = [bounding_box.max[i] - bounding_box.min[i] for i in range(0, 3)]
+        self.bounding_box, self.resolution = calculate_dimensions(
+            get_vertices(mesh), self.settings.volume_resolution, self.settings.vertical_resolution
+        )
+        print([self.bounding_box.max[i] - self.bounding_box.min[i] for i in range(0, 3)])
 
-        print(dimensions)
-
-        max_dim = functools.reduce(max, dimensions)
-        max_resolution = self.settings.volume_resolution
-        self.resolution = list(map(lambda x: int(x / max_dim * max_resolution), dimensions))
+    def finish_profile(self):
+        # The report of exporting bakes is stored next to the volumes; the others only print it
+        if self.should_output("EXPORT"):
+            print("profile written to " + self.profile.save(self.output_path))
+        else:
+            print(json.dumps(self.profile.to_json(), indent=4))
 
     def should_output(self, methode):
         output_methode = self.settings.output_methode
         return output_methode == "BOTH" or output_methode == methode
 
     def pad_sensors(self, sensors, mesh):
-        # FIXME: When a sensor is too close to not only one but multiple walls/obstacles,
-        # FIXME: it is currently padded only away orthogonally from one of the obstacles 
-        # FIXME: (i. e., the closest one). Make sure that it is padded away from _all_
-        # FIXME: obstacles which are too close to it.
-        resolution = self.resolution
-        bounding_box = self.bounding_box
-
-        dist_treshold = ((bounding_box.max[0] - bounding_box.min[0]) / resolution[0])
-        bvh = BVHTree.FromBMesh(mesh, epsilon=0.0)
-
+        positions = pad_sensor_positions(
+            [sensor.location[:] for sensor in sensors], get_triangles(mesh), self.bounding_box, self.resolution, get_find_nearest(mesh)
+        )
         for index, sensor in enumerate(sensors):
-            world_point = sensor.location
-            point, normal, _, dist = bvh.find_nearest(world_point)
-
-            if dist <= dist_treshold:
-                p2 = point - world_point
-                v = p2.dot(normal)
-                offset_direction = Vector(normal)
-                offset_direction.normalize()
-                offset_length = (dist_treshold - dist) + 0.01
-                if v >= 0.0:
-                    # sensor lies within obstacle
-                    offset_direction = -offset_direction 
-                # else: 
-                    # sensor is outside of obstacle, but within dist_threshold
-                sensors[index].location = sensor.location + offset_direction * offset_length
-
+            sensor.location = Vector(positions[index])
         return sensors
 
-    def execute(self, context):
+    def prepare(self, context):
+        """Collects the obstacles and sensors of the scene; returns False if there is nothing to bake"""
         print("bake volume")
         self.settings = context.scene.distance_bake
+        self.profile = BakeProfile("bake volume")
+        self.resolve_paths()
 
         mesh = self.get_mesh(context)
         if mesh is None:
             print("No obstacle collection selected and no mesh object active to use as obstacle.")
-            return {"CANCELLED"}
+            return False
         self.calculate_dimensions(mesh)
 
         sensors_name = self.settings.sensor_collection
@@ -668,94 +533,233 @@ class bakeDistanceVolume(bpy.types.Operator):
         # TODO: Prevent this operation from changing the actual objects, i. e., work on duplicates!
         sensors = self.pad_sensors(sensors, mesh)
 
-        distances = self.calculate_occlusion(mesh)
-        self.generate_texture("debug__distances", distances, True)
-
+        names = []
         for index, sensor in enumerate(sensors):
-            sensor_distances = copy.deepcopy(distances)
-            self.calculate_distances(sensor.location, sensor_distances)
-            if index == 0 and self.should_output("PREVIEW"):
-                self.generate_preview_texture(sensor_distances)
-
-            if hasattr(sensor, "name"): name = sensor.name
-            else: name = "sensor_" + str(index)
+            if hasattr(sensor, "name"): names.append(sensor.name)
+            else: names.append("sensor_" + str(index))
+        self.mesh = mesh
+        self.names = names
+        self.positions = [sensor.location[:] for sensor in sensors]
+        self.cells = [self.get_cell(sensor.location) for sensor in sensors]
+        return True
+
+    def run(self):
+        """Bakes and exports the prepared volumes without accessing the scene, so that it can run in the background"""
+        mesh = self.mesh
+        names = self.names
+        cells = self.cells
+        triangles = get_triangles(mesh)
+
+        if self.settings.sensor_volume_layout == "NEAREST":
+            return self.bake_nearest(mesh, triangles, names, cells)
+
+        # Only export the sensors whose inputs changed since they were recorded in the output directory’s manifest
+        exported = set()
+        if self.should_output("EXPORT"):
+            output_path = self.output_path
+            # Pillow does not create missing directories (unlike Blender’s image saving)
+            os.makedirs(output_path, exist_ok=True)
+            outputs = load_manifest(output_path) if self.settings.incremental_bake else {}
+            settings = get_bake_settings(
+                self.bounding_box, self.resolution,
+                self.settings.flooding_directions, self.settings.propagation_methode, self.settings.occlusion_methode,
+                self.get_quantization_settings()
+            )
+            self.quantizations = load_quantization(output_path)
+            geometry_hash = get_geometry_hash(triangles)
+            inputs = [get_sensor_inputs(geometry_hash, settings, cells[index], position) for index, position in enumerate(self.positions)]
+            if self.should_export_format("CONTAINER"):
+                self.load_container_volumes()
+            for index, name in enumerate(names):
+                files = get_quantized_files(name, self.get_quantization_bits(), self.get_mip_levels()) if self.should_export_format("PNG") else []
+                if not is_up_to_date(outputs, output_path, name, inputs[index], files):
+                    exported.add(index)
+                elif self.should_export_format("CONTAINER") and name not in self.container_volumes:
+                    exported.add(index)
+            print("{0} of {1} sensors are up to date".format(len(names) - len(exported), len(names)))
+
+        # The preview shows the selected sensor (or the first one); the others are baked on demand when selected
+        preview_index = names.index(self.settings.preview_sensor) if self.settings.preview_sensor in names else 0
+        baked = sorted(exported | ({preview_index} if self.should_output("PREVIEW") and len(names) > 0 else set()))
+        if len(baked) == 0:
+            if self.should_output("EXPORT") and self.should_export_format("CONTAINER") and self.container_outdated:
+                self.save_container_volumes()
+            return {"FINISHED"}
 
-            if self.should_output("EXPORT"):
-                self.generate_texture(name, sensor_distances)
+        state = self.calculate_occlusion(mesh, triangles)
+        if self.settings.export_occlusion_texture and self.should_output("EXPORT"):
+            self.generate_texture("debug__distances", create_distances(state.shape), state, True)
+        if self.should_output("PREVIEW"):
+            self.preview_bake = (
+                state, dict(zip(names, cells)), self.get_step_widths(), self.settings.flooding_directions, self.settings.propagation_methode
+            )
+
+        for job, sensor_distances, sensor_state in self.bake_sensors(state, [cells[index] for index in baked], [names[index] for index in baked]):
+            index = baked[job]
+            if index == preview_index and self.should_output("PREVIEW"):
+                self.generate_preview_texture(names[index], sensor_distances, sensor_state)
+
+            if index in exported:
+                self.export_volume(names[index], sensor_distances, sensor_state)
+                if not self.should_export_format("CONTAINER"):
+                    outputs[names[index]] = inputs[index]
+                    save_manifest(output_path, outputs)
+
+        # The container is written once all sensors are baked; only then are they recorded as up to date
+        if len(exported) > 0 and self.should_export_format("CONTAINER"):
+            self.save_container_volumes()
+            for index in exported:
+                outputs[names[index]] = inputs[index]
+            save_manifest(output_path, outputs)
 
         return {"FINISHED"}
 
+    def finish(self):
+        self.update_preview_texture()
+        self.finish_profile()
+
+    def execute(self, context):
+        if not self.prepare(context):
+            return {"CANCELLED"}
+        result = self.run()
+        self.finish()
+        return result
+
+    def invoke(self, context, event):
+        # Bakes started from the panel run in the background; ESC stops them once the current stage reports its progress
+        if not self.prepare(context):
+            return {"CANCELLED"}
+        self.settings = copy_settings(self.settings)
+        self.create_worker_pool()
+        self.thread = threading.Thread(target=self.run_in_background, daemon=True)
+        self.thread.start()
+
+        window_manager = context.window_manager
+        self.timer = window_manager.event_timer_add(0.25, window=context.window)
+        window_manager.progress_begin(0.0, 1.0)
+        window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def create_worker_pool(self):
+        # Forking the workers from the background thread could copy locks held by Blender’s other threads into them,
+        # which would never be released; hence, they are forked here, and the background thread only hands out the jobs
+        worker_count = get_worker_count(self.settings.bake_workers, len(self.cells))
+        if worker_count > 1 and self.settings.sensor_volume_layout != "NEAREST":
+            self.worker_pool = WorkerPool(
+                (self.resolution[2], self.resolution[1], self.resolution[0]), self.settings.flooding_directions,
+                self.settings.propagation_methode, self.get_step_widths(), worker_count
+            )
+
+    def run_in_background(self):
+        try:
+            self.result = self.run()
+        except BakeCancelled:
+            self.result = {"CANCELLED"}
+        except Exception as exception:
+            traceback.print_exc()
+            self.error = exception
+            self.result = {"CANCELLED"}
+
+    def modal(self, context, event):
+        if event.type == "ESC" and event.value == "PRESS" and not self.profile.cancelled:
+            print("cancelling the bake")
+            self.profile.cancel()
+            return {"RUNNING_MODAL"}
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        if self.thread.is_alive():
+            progress = self.profile.get_progress()
+            if progress is not None:
+                title, fraction = progress
+                context.window_manager.progress_update(fraction)
+                context.workspace.status_text_set("{0}: {1:.0f}% (ESC to cancel)".format(title, fraction * 100))
+            return {"PASS_THROUGH"}
+
+        self.thread.join()
+        if self.worker_pool is not None:
+            self.worker_pool.terminate()
+        context.window_manager.event_timer_remove(self.timer)
+        context.window_manager.progress_end()
+        context.workspace.status_text_set(None)
+        if self.error is not None:
+            self.report({"ERROR"}, "Baking failed: {0}".format(self.error))
+            return {"CANCELLED"}
+        if self.profile.cancelled:
+            # Sensors that were exported before are recorded in the manifest, so that the next bake continues from there
+            self.report({"WARNING"}, "Baking cancelled")
+            return {"CANCELLED"}
+
+        # The preview texture is stored in the scene’s (instead of the copied) settings
+        self.settings = context.scene.distance_bake
+        self.finish()
+        return self.result
+
 
 class bakeDistanceVolumeOutside(bakeDistanceVolume):
     bl_idname = "render.volume_distance_outside_bake"
     bl_label = "Bake Outside Distance Volume"
 
-    def calculate_distances(self, outside_object, distances, context):
-        global progress_goal
-        resolution = self.resolution
-        bounding_box = self.bounding_box
-
-        # TODO: Replace this with an appropriate, either volume or mesh based, dynamic lookup 
-        dist_treshold = ((bounding_box.max[0] - bounding_box.min[0]) / resolution[0])
-        dist_treshold *= 3.0
+    def get_outside_triangles(self, outside_object, context):
+        outside_object_mesh = bmesh.new()
+        outside_object_mesh.from_object(outside_object, context.evaluated_depsgraph_get())
+        outside_object_mesh.transform(outside_object.matrix_world)
+        triangles = get_triangles(outside_object_mesh)
+        outside_object_mesh.free()
+        return triangles
 
-        resolution = self.resolution
-        bounding_box = self.bounding_box
-        step_widths = [((bounding_box.max[i] - bounding_box.min[i]) / resolution[i]) for i in range(0, 3)]
-        mean_step_width = sum(step_widths) / len(step_widths)
+    def calculate_distances(self, outside_triangles, distances, state):
+        # TODO: Replace this with an appropriate, either volume or mesh based, dynamic lookup
+        # The cells whose mid-points (as in calculate_occlusion) are closer to the outside mesh than three steps along x
+        dist_treshold = 3.0 * self.get_step_widths()[0]
 
-        outside_object_mesh = bmesh.new()
-        bm = bmesh.new()
-        bm.from_object(outside_object, context.evaluated_depsgraph_get())
-        bm.transform(outside_object.matrix_world)
-        m = bpy.data.meshes.new("temp")
-        bm.to_mesh(m)
-        outside_object_mesh.from_mesh(m)
-        bpy.data.meshes.remove(m)
-        outside_bvh = BVHTree.FromBMesh(outside_object_mesh, epsilon=0.0)
-
-        cells_to_check = []
-
-        for z in range(0, resolution[2]):
-            grid = [None] * resolution[1]
-            for y in range(0, resolution[1]):
-                row = [None] * resolution[0]
-                for x in range(0, resolution[0]):
-                    world_point = Vector([(float(val) / (resolution[i] - 1)) * (bounding_box.max[i]-bounding_box.min[i]) + bounding_box.min[i] for i, val in enumerate((x, y, z))])
-
-                    _, _, _, dist = outside_bvh.find_nearest(world_point)
-                    
-                    if dist <= dist_treshold:
-                        set_cell([x, y, z], 0, distances, cells_to_check)
-        self.calculate_distances_for_cells(cells_to_check, distances, mean_step_width)
+        with self.profile.stage("find outside cells", goal=len(outside_triangles)) as stage:
+            cells_to_check = find_cells_near_triangles(outside_triangles, self.bounding_box, self.resolution, dist_treshold, stage.progress).tolist()
+            stage.count("triangles", len(outside_triangles))
+            stage.count("seed_cells", len(cells_to_check))
+        self.calculate_distances_for_cells(cells_to_check, distances, state, self.get_step_widths(), "outside")
 
 
-    def execute(self, context):
+    def prepare(self, context):
         print("bake volume")
         self.settings = context.scene.distance_bake
+        self.profile = BakeProfile("bake outside volume")
+        self.resolve_paths()
 
         mesh = self.get_mesh(context)
         if mesh is None:
             print("No obstacle collection selected and no mesh object active to use as obstacle.")
-            return {"CANCELLED"}
+            return False
         self.calculate_dimensions(mesh)
 
         outside_object_name = self.settings.outside_volume_mesh
         if outside_object_name == "":
             print("No outside volume selected.")
-            return {"CANCELLED"}
+            return False
         else:
             outside_object = bpy.context.scene.objects[outside_object_name]
 
-        distances = self.calculate_occlusion(mesh)
+        self.mesh = mesh
+        self.outside_triangles = self.get_outside_triangles(outside_object, context)
+        return True
+
+    def run(self):
+        state = self.calculate_occlusion(self.mesh)
 
-        outside_distances = copy.deepcopy(distances)
-        self.calculate_distances(outside_object, outside_distances, context)
+        outside_distances = create_distances(state.shape)
+        outside_state = state.copy()
+        self.calculate_distances(self.outside_triangles, outside_distances, outside_state)
         
         name = "outside"
 
         if self.should_output("EXPORT"):
-            self.generate_texture(name, outside_distances)
+            os.makedirs(self.output_path, exist_ok=True)
+            self.quantizations = load_quantization(self.output_path)
+            if self.should_export_format("CONTAINER"):
+                self.load_container_volumes()
+            self.export_volume(name, outside_distances, outside_state)
+            if self.should_export_format("CONTAINER"):
+                self.save_container_volumes()
 
         return {"FINISHED"}
 
@@ -775,7 +779,6 @@ class bakeDistances(bpy.types.Operator):
         if active_object.type != "MESH":
             print("Active object is not a mesh object.")
             return {"CANCELLED"}
-        mesh = active_object.data
 
         uv_map = active_object.data.uv_layers.active
         if uv_map is None:
@@ -796,21 +799,43 @@ class bakeDistances(bpy.types.Operator):
             print("Active texture node has no texture selected.")
             return {"CANCELLED"}
 
-        sensor_collection_name = context.scene.distance_bake.sensor_collection
+        settings = context.scene.distance_bake
+        sensor_collection_name = settings.sensor_collection
         print("sensor_collection_name:", sensor_collection_name)
-        point = context.scene.cursor.location
+        sensors = [("cursor", context.scene.cursor.location[:])]
         if sensor_collection_name != "":
             sensor_collection = bpy.data.collections[sensor_collection_name]
             if len(sensor_collection.objects) > 0:
-                point = sensor_collection.objects[0].location
-
-        b_mesh = bmesh.new()
-        b_mesh.from_mesh(mesh)
-        bmesh.ops.triangulate(b_mesh, faces=b_mesh.faces, quad_method="FIXED", ngon_method="EAR_CLIP")
-        b_uv_map = b_mesh.loops.layers.uv.active
+                sensors = [(sensor.name, sensor.location[:]) for sensor in sensor_collection.objects]
+
+        # The texel positions are rasterized once for all sensors (and reused by the next bake of the same layout)
+        uvs, positions = get_uv_triangles(active_object, uv_map)
+        profile = BakeProfile("bake distances")
+        with profile.stage("rasterize uv layout", active_object.name, len(uvs)) as stage:
+            texel_positions, covered, cached = get_cached_texel_positions(
+                uvs, positions, texture.size[0], texture.size[1], settings.margin, stage.progress
+            )
+            stage.count("faces", len(uvs))
+            stage.count("covered_texels", int(numpy.count_nonzero(covered)))
+            stage.count("cache_hits", 1 if cached else 0)
+
+        if settings.uv_sensor_layout == "FIRST":
+            outputs = [(texture, sensors[:1])]
+        elif settings.uv_sensor_layout == "PER_SENSOR":
+            outputs = [(get_sensor_image(texture, "{0}_{1}".format(texture.name, name)), [(name, point)]) for name, point in sensors]
+        else:
+            outputs = []
+            for index in range(0, len(sensors), 4):
+                image = get_sensor_image(texture, "{0}_sensors_{1}".format(texture.name, index // 4))
+                image["sensors"] = json.dumps([name for name, _ in sensors[index:index + 4]])
+                outputs.append((image, sensors[index:index + 4]))
+
+        packed = settings.uv_sensor_layout == "CHANNELS"
+        for image, image_sensors in outputs:
+            with profile.stage("bake distances", image.name) as stage:
+                bake_distances(image, texel_positions, covered, [point for _, point in image_sensors], stage, packed)
+        print(json.dumps(profile.to_json(), indent=4))
 
-        bake_distances(context, active_object, b_mesh, b_uv_map, texture, point)
-        
         return {"FINISHED"}
 
 class distanceBakeSensorImport(bpy.types.Operator):
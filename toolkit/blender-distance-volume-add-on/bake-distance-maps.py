@@ -0,0 +1,348 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Bakes the distance maps of one or more building folders without Blender’s UI, e.g.:
+# blender --background --factory-startup --python bake-distance-maps.py -- -i <building folder> [-i <building folder> …]
+
+import sys, getopt, os, glob, json, math, shutil, traceback, types
+import importlib.util
+import bpy, numpy
+
+USAGE = (
+    "bake-distance-maps.py -i <building folder> [-i <building folder> …] [-r <volume resolution>] [-w <workers>] "
+    "[-f <STRAIGHT|DIAGONAL|DIAGONAL_5|FAST_MARCHING>] [-p <DIJKSTRA|FIFO|SWEEP>] [-m <MESH|VOLUME>] "
+    "[-x <excluded object>[,<excluded object>…]] [-o <outside object>] [-e <PNG|CONTAINER|BOTH>] "
+    "[-q <BOUNDING_BOX|RANGE_16|RANGE_12|RANGE_8>] [--quantization-range=<distance>] [-b <brick size>] [--mip-levels=<levels>] "
+    "[--force]"
+)
+
+
+def load_add_on():
+    # Load the add-on from the directory of this script, so that it does not need to be installed (or enabled)
+    add_on_path = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(
+        "roomcanvas_distance_volume", os.path.join(add_on_path, "__init__.py"), submodule_search_locations=[add_on_path]
+    )
+    add_on = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = add_on
+    spec.loader.exec_module(add_on)
+    add_on.register()
+    return add_on
+
+
+def parse_config_value(value):
+    value = value.split(" #")[0].strip()
+    if value.startswith("'") and value.endswith("'"):
+        return value[1:-1]
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_config(config_path):
+    """Returns the top-level sections of the building’s config.yaml file as dicts
+
+    PyYAML is not bundled with Blender; if it is not available, only the simple "key: value" entries directly below
+    the top-level keys (such as sensorPositions) are read.
+    """
+    try:
+        import yaml
+        with open(config_path, encoding="utf-8") as config_file:
+            return yaml.safe_load(config_file)
+    except ImportError:
+        pass
+
+    config = {}
+    section = None
+    section_indentation = None
+    with open(config_path, encoding="utf-8") as config_file:
+        for line in config_file:
+            content = line.rstrip()
+            if content.strip() == "" or content.strip().startswith("#"):
+                continue
+            indentation = len(content) - len(content.lstrip())
+            if indentation == 0:
+                key = content.split(":")[0].strip()
+                section = config.setdefault(key, {})
+                section_indentation = None
+                continue
+            if section is None or ":" not in content or content.strip().startswith("-"):
+                continue
+            if section_indentation is None:
+                section_indentation = indentation
+            if indentation != section_indentation:
+                continue
+            key, value = content.strip().split(":", 1)
+            if value.strip() != "":
+                section[parse_config_value(key)] = parse_config_value(value)
+    return config
+
+
+def reset_scene():
+    # Delete all default objects and collections in the scene
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete(use_global=False)
+    for collection in list(bpy.data.collections):
+        bpy.data.collections.remove(collection)
+
+
+def create_collection(name):
+    collection = bpy.data.collections.new(name)
+    bpy.context.scene.collection.children.link(collection)
+    return collection
+
+
+def get_world_bounds(objects):
+    minimum = numpy.full(3, numpy.inf)
+    maximum = numpy.full(3, -numpy.inf)
+    for obj in objects:
+        vertices = numpy.empty(len(obj.data.vertices) * 3)
+        obj.data.vertices.foreach_get("co", vertices)
+        vertices = vertices.reshape(-1, 3) @ numpy.array(obj.matrix_world)[0:3, 0:3].T + numpy.array(obj.matrix_world)[0:3, 3]
+        if len(vertices) > 0:
+            minimum = numpy.minimum(minimum, vertices.min(axis=0))
+            maximum = numpy.maximum(maximum, vertices.max(axis=0))
+    return minimum, maximum
+
+
+def get_volume_resolution(obstacles, amount_of_slices):
+    # Choose the smallest resolution that yields the number of height slices the viewer expects (see calculate_dimensions)
+    minimum, maximum = get_world_bounds(obstacles)
+    dimensions = [float(maximum[i] - minimum[i]) for i in range(0, 3)]
+    max_dim = max(dimensions)
+    volume_resolution = max(1, int(math.ceil(amount_of_slices * max_dim / dimensions[2])) - 1)
+    while int(dimensions[2] / max_dim * volume_resolution) < amount_of_slices:
+        volume_resolution += 1
+    return volume_resolution
+
+
+def bake_building(add_on, building_path, options):
+    config = read_config(os.path.join(building_path, "properties", "config.yaml"))
+    output_path = os.path.join(building_path, "distance-maps")
+    os.makedirs(output_path, exist_ok=True)
+
+    glb_name = config.get("buildingModel", {}).get("presentationGlb")
+    if glb_name:
+        glb_path = os.path.join(building_path, "3d-floor-plans", glb_name)
+    else:
+        glb_paths = sorted(glob.glob(os.path.join(building_path, "3d-floor-plans", "*.glb")))
+        if len(glb_paths) != 1:
+            raise RuntimeError("Expected exactly one .glb file in {0}".format(os.path.join(building_path, "3d-floor-plans")))
+        glb_path = glb_paths[0]
+
+    reset_scene()
+    bpy.ops.import_scene.gltf(filepath=glb_path)
+
+    obstacles_collection = create_collection("obstacles")
+    obstacles = []
+    for obj in bpy.context.scene.objects:
+        if obj.type == "MESH" and obj.name not in options["excluded_objects"]:
+            obstacles_collection.objects.link(obj)
+            obstacles.append(obj)
+    if len(obstacles) == 0:
+        raise RuntimeError("No obstacles found in {0}".format(glb_path))
+
+    # Sensors sharing the same position are only baked once; their distance maps are copied afterwards
+    sensors_collection = create_collection("sensors")
+    baked_sensor_ids = {}
+    for sensor_id, sensor_position in config.get("sensorPositions", {}).items():
+        position = tuple(sensor_position)
+        if position in baked_sensor_ids:
+            continue
+        baked_sensor_ids[position] = sensor_id
+        sensor = bpy.data.objects.new("sensor_{}".format(sensor_id), None)
+        sensor.location = (sensor_position[0], -sensor_position[2], sensor_position[1])
+        sensors_collection.objects.link(sensor)
+    if len(baked_sensor_ids) == 0:
+        raise RuntimeError("No sensorPositions found in {0}".format(building_path))
+
+    settings = bpy.context.scene.distance_bake
+    settings.obstacles_collection = obstacles_collection.name
+    settings.sensor_collection = sensors_collection.name
+    settings.output_methode = "EXPORT"
+    settings.output_path = output_path
+    settings.export_occlusion_texture = False
+    settings.incremental_bake = options["incremental_bake"]
+    for key in ("flooding_directions", "propagation_methode", "occlusion_methode", "bake_workers", "export_format", "quantization", "quantization_range", "mip_levels"):
+        if options[key] is not None:
+            setattr(settings, key, options[key])
+    if options["container_brick_size"] is not None:
+        settings.use_container_bricks = options["container_brick_size"] > 0
+        if options["container_brick_size"] > 0:
+            settings.container_brick_size = options["container_brick_size"]
+    if options["volume_resolution"] is not None:
+        settings.volume_resolution = options["volume_resolution"]
+    elif "amountOfSlices" in config.get("distanceMaps", {}):
+        settings.volume_resolution = get_volume_resolution(obstacles, int(config["distanceMaps"]["amountOfSlices"]))
+    if "amountOfSlices" in config.get("distanceMaps", {}):
+        # The viewer expects exactly this many height slices, regardless of the horizontal resolution
+        settings.vertical_resolution = int(config["distanceMaps"]["amountOfSlices"])
+    print("{0}: {1} obstacles, {2} sensor positions, volume resolution {3}".format(
+        building_path, len(obstacles), len(baked_sensor_ids), settings.volume_resolution
+    ))
+
+    if "FINISHED" not in bpy.ops.render.volume_distance_bake():
+        raise RuntimeError("Baking the sensors’ distance volumes failed")
+
+    container_path = os.path.join(output_path, add_on.distancevolume.CONTAINER_NAME)
+    write_png = settings.export_format in ("PNG", "BOTH")
+    write_container = settings.export_format in ("CONTAINER", "BOTH")
+    if write_container:
+        header, volumes = add_on.distancevolume.load_container(container_path)
+    if write_png:
+        png_quantizations = add_on.distancevolume.load_quantization(output_path)
+    mip_names = [add_on.distancevolume.get_mip_name("", level) for level in range(1, settings.mip_levels + 1)]
+    for sensor_id, sensor_position in config.get("sensorPositions", {}).items():
+        baked_sensor_id = baked_sensor_ids[tuple(sensor_position)]
+        if baked_sensor_id != sensor_id:
+            if write_png:
+                # The volume and its mip levels, with the lower bits only for more than 8 bits
+                for suffix in [""] + mip_names:
+                    baked_name = "sensor_{0}{1}".format(baked_sensor_id, suffix)
+                    name = "sensor_{0}{1}".format(sensor_id, suffix)
+                    for bits in ("low", "high"):
+                        if os.path.isfile(os.path.join(output_path, "{0}_{1}.png".format(baked_name, bits))):
+                            shutil.copyfile(
+                                os.path.join(output_path, "{0}_{1}.png".format(baked_name, bits)),
+                                os.path.join(output_path, "{0}_{1}.png".format(name, bits))
+                            )
+                    if baked_name in png_quantizations:
+                        png_quantizations[name] = png_quantizations[baked_name]
+            if write_container:
+                volumes["sensor_{}".format(sensor_id)] = volumes["sensor_{}".format(baked_sensor_id)]
+    if write_png:
+        add_on.distancevolume.save_quantization(output_path, png_quantizations)
+    if write_container:
+        bounding_box = types.SimpleNamespace(min=header["boundingBox"]["min"], max=header["boundingBox"]["max"])
+        quantizations = {entry["name"]: entry["quantization"] for entry in header["volumes"] if "quantization" in entry}
+        for sensor_id, sensor_position in config.get("sensorPositions", {}).items():
+            baked_sensor_name = "sensor_{}".format(baked_sensor_ids[tuple(sensor_position)])
+            if baked_sensor_name in quantizations:
+                quantizations["sensor_{}".format(sensor_id)] = quantizations[baked_sensor_name]
+        brick_size = settings.container_brick_size if settings.use_container_bricks else 0
+        add_on.distancevolume.save_container(container_path, volumes, bounding_box, quantizations=quantizations, brick_size=brick_size)
+
+    outside_object = options["outside_object"]
+    if outside_object not in bpy.context.scene.objects:
+        print("No outside object named {0}; skipping outside.png".format(outside_object))
+        return
+    settings.outside_volume_mesh = outside_object
+    if "FINISHED" not in bpy.ops.render.volume_distance_outside_bake():
+        raise RuntimeError("Baking the outside distance volume failed")
+
+    if not write_png:
+        return
+    # The viewer only loads the higher 8 bits of the outside distances
+    os.replace(os.path.join(output_path, "outside_high.png"), os.path.join(output_path, "outside.png"))
+    if os.path.isfile(os.path.join(output_path, "outside_low.png")):
+        os.remove(os.path.join(output_path, "outside_low.png"))
+
+
+def main(argv):
+    building_paths = []
+    options = {
+        "volume_resolution": None,
+        "bake_workers": None,
+        "flooding_directions": None,
+        "propagation_methode": None,
+        "occlusion_methode": None,
+        "excluded_objects": ["Base"],
+        "outside_object": "windows-no-glass",
+        "incremental_bake": True,
+        "export_format": None,
+        "quantization": None,
+        "quantization_range": None,
+        "container_brick_size": None,
+        "mip_levels": None,
+    }
+
+    try:
+        opts, args = getopt.getopt(argv, "hi:r:w:f:p:m:x:o:e:q:b:", [
+            "input=",
+            "resolution=",
+            "workers=",
+            "flooding-directions=",
+            "propagation=",
+            "occlusion=",
+            "exclude=",
+            "outside=",
+            "export-format=",
+            "quantization=",
+            "quantization-range=",
+            "bricks=",
+            "mip-levels=",
+            "force",
+        ])
+    except getopt.GetoptError as err:
+        print(USAGE)
+        print(err)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == '-h':
+            print(USAGE)
+            sys.exit()
+        elif opt in ("-i", "--input"):
+            building_paths.append(arg)
+        elif opt in ("-r", "--resolution"):
+            options["volume_resolution"] = int(arg)
+        elif opt in ("-w", "--workers"):
+            options["bake_workers"] = int(arg)
+        elif opt in ("-f", "--flooding-directions"):
+            options["flooding_directions"] = arg
+        elif opt in ("-p", "--propagation"):
+            options["propagation_methode"] = arg
+        elif opt in ("-m", "--occlusion"):
+            options["occlusion_methode"] = arg
+        elif opt in ("-x", "--exclude"):
+            options["excluded_objects"] = [name for name in arg.split(",") if name != ""]
+        elif opt in ("-o", "--outside"):
+            options["outside_object"] = arg
+        elif opt in ("-e", "--export-format"):
+            options["export_format"] = arg
+        elif opt in ("-q", "--quantization"):
+            options["quantization"] = arg
+        elif opt == "--quantization-range":
+            options["quantization_range"] = float(arg)
+        elif opt in ("-b", "--bricks"):
+            options["container_brick_size"] = int(arg)
+        elif opt == "--mip-levels":
+            options["mip_levels"] = int(arg)
+        elif opt == "--force":
+            options["incremental_bake"] = False
+
+    if len(building_paths) == 0:
+        print(USAGE)
+        sys.exit(2)
+
+    add_on = load_add_on()
+
+    # Keep going with the remaining buildings if one of them fails, but report the failure via the exit code
+    failed_building_paths = []
+    for building_path in building_paths:
+        try:
+            bake_building(add_on, os.path.abspath(building_path), options)
+        except Exception:
+            traceback.print_exc()
+            failed_building_paths.append(building_path)
+
+    if len(failed_building_paths) > 0:
+        print("Baking failed for: {0}".format(", ".join(failed_building_paths)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Get all args after " -- "
+    # @see https://blender.stackexchange.com/a/8405
+    main(sys.argv[sys.argv.index("--") + 1:])
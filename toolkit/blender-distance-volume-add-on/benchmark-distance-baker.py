@@ -0,0 +1,250 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Times the stages of the distance baker for procedurally generated floor plans, without Blender, e.g.:
+# python benchmark-distance-baker.py -r 32,64,128 -s 2 -o benchmark.json
+
+import sys, getopt, os, json, platform, tempfile, time
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import distancevolume
+
+BENCHMARK_VERSION = 1
+FLOODING_DIRECTIONS = ["STRAIGHT", "DIAGONAL", "DIAGONAL_5", "FAST_MARCHING"]
+
+USAGE = (
+    "benchmark-distance-baker.py [-r <resolution>[,<resolution>…]] [-s <sensors>] [-x <rooms along x>] [-y <rooms along y>] "
+    "[-f <STRAIGHT|DIAGONAL|DIAGONAL_5|FAST_MARCHING>[,…]] [-p <DIJKSTRA|FIFO|SWEEP>[,…]] [-m <MESH|VOLUME>] "
+    "[-n <repetitions>] [--seed=<seed>] [-o <output file>]"
+)
+
+
+def get_box_triangles(low, high):
+    """Returns the 12 triangles (outward facing) of an axis-aligned box"""
+    corners = [[high[axis] if index & (1 << axis) else low[axis] for axis in range(0, 3)] for index in range(0, 8)]
+    quads = [(0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4), (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5)]
+    triangles = []
+    for a, b, c, d in quads:
+        triangles += [[corners[a], corners[b], corners[c]], [corners[a], corners[c], corners[d]]]
+    return triangles
+
+
+def generate_floor_plan(rooms_x = 3, rooms_y = 2, sensors = 2, seed = 0, room_size = 4.0, height = 2.6, wall_thickness = 0.2, door_width = 1.0, door_height = 2.1):
+    """Returns the triangles ((n, 3, 3) array) of a single-storey building with a grid of rooms_x × rooms_y rooms, whose
+    interior walls all have a door at a random position, and the positions of the sensors, each in a random room.
+    """
+    random = numpy.random.RandomState(seed)
+    width = rooms_x * room_size
+    depth = rooms_y * room_size
+    half = wall_thickness / 2.0
+
+    # Floor, ceiling, and outer walls
+    triangles = get_box_triangles((0.0, 0.0, -wall_thickness), (width, depth, 0.0))
+    triangles += get_box_triangles((0.0, 0.0, height), (width, depth, height + wall_thickness))
+    triangles += get_box_triangles((0.0, 0.0, 0.0), (width, wall_thickness, height))
+    triangles += get_box_triangles((0.0, depth - wall_thickness, 0.0), (width, depth, height))
+    triangles += get_box_triangles((0.0, 0.0, 0.0), (wall_thickness, depth, height))
+    triangles += get_box_triangles((width - wall_thickness, 0.0, 0.0), (width, depth, height))
+
+    def add_wall(axis, position, start, end):
+        # A wall along the given axis (0: x, 1: y) from start to end, with a door and the lintel above it
+        door = random.uniform(start + wall_thickness + 0.1, end - wall_thickness - door_width - 0.1)
+        for low, high, top in ((start, door, height), (door + door_width, end, height), (door, door + door_width, None)):
+            if top is None:
+                low_corner, high_corner = [0.0, 0.0, door_height], [0.0, 0.0, height]
+            else:
+                low_corner, high_corner = [0.0, 0.0, 0.0], [0.0, 0.0, top]
+            low_corner[axis], high_corner[axis] = low, high
+            low_corner[1 - axis], high_corner[1 - axis] = position - half, position + half
+            triangles.extend(get_box_triangles(low_corner, high_corner))
+
+    for column in range(1, rooms_x):
+        for row in range(0, rooms_y):
+            add_wall(1, column * room_size, row * room_size, (row + 1) * room_size)
+    for row in range(1, rooms_y):
+        for column in range(0, rooms_x):
+            add_wall(0, row * room_size, column * room_size, (column + 1) * room_size)
+
+    # Sensors at least half a meter away from the walls, at a typical mounting height
+    positions = []
+    for sensor in range(0, sensors):
+        column, row = random.randint(0, rooms_x), random.randint(0, rooms_y)
+        positions.append([
+            column * room_size + random.uniform(0.5 + half, room_size - 0.5 - half),
+            row * room_size + random.uniform(0.5 + half, room_size - 0.5 - half),
+            random.uniform(1.0, min(2.0, height - 0.5))
+        ])
+    return numpy.array(triangles, dtype=numpy.float64), positions
+
+
+def measure(function, repetitions):
+    """Returns the shortest duration (in seconds) of the repetitions and the result of the last one"""
+    durations = []
+    for repetition in range(0, repetitions):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return min(durations), result
+
+
+def benchmark_resolution(triangles, sensor_positions, volume_resolution, options):
+    bounding_box, resolution = distancevolume.calculate_dimensions(triangles.reshape(-1, 3), volume_resolution)
+    step_widths = distancevolume.get_step_widths(bounding_box, resolution)
+    cells = [distancevolume.get_cell(position, bounding_box, resolution) for position in sensor_positions]
+    repetitions = options["repetitions"]
+    result = {
+        "volumeResolution": volume_resolution,
+        "resolution": [int(size) for size in resolution],
+        "cells": int(resolution[0] * resolution[1] * resolution[2]),
+        "sensors": len(cells),
+    }
+
+    result["occlusion"], state = measure(
+        lambda: distancevolume.calculate_occlusion(triangles, bounding_box, resolution, options["occlusion_methode"]), repetitions
+    )
+    result["occludedCells"] = int(numpy.count_nonzero(state != distancevolume.FREE))
+
+    result["propagation"] = []
+    volumes = None
+    for flooding_directions in options["flooding_directions"]:
+        # Fast marching ignores the propagation methode
+        for propagation_methode in options["propagation_methodes"] if flooding_directions != "FAST_MARCHING" else [None]:
+            seconds = 0.0
+            counters = []
+            sensor_volumes = []
+            for cell in cells:
+                duration, (distances, sensor_state, sensor_counters) = measure(
+                    lambda: distancevolume.bake_distance_volume(state, [cell], step_widths, flooding_directions, propagation_methode or "DIJKSTRA"),
+                    repetitions
+                )
+                seconds += duration
+                counters.append(dict(sensor_counters))
+                sensor_volumes.append((distances, sensor_state))
+            if volumes is None:
+                volumes = sensor_volumes
+            result["propagation"].append({
+                "floodingDirections": flooding_directions,
+                "propagation": propagation_methode,
+                "seconds": seconds,
+                "secondsPerSensor": seconds / max(len(cells), 1),
+                "counters": counters,
+            })
+            print("  {0} {1}: {2:.3f} s".format(flooding_directions, propagation_methode or "", seconds), file=sys.stderr)
+
+    # Texture generation and PNG encoding of the volumes of the first flooding directions
+    result["texture"] = 0.0
+    result["png"] = 0.0
+    result["pngBytes"] = 0
+    with tempfile.TemporaryDirectory() as output_path:
+        for index, (distances, sensor_state) in enumerate(volumes or []):
+            duration, data = measure(lambda: distancevolume.encode_texture(distances, sensor_state, bounding_box), repetitions)
+            result["texture"] += duration
+            filepath = os.path.join(output_path, "sensor_{0}".format(index))
+            duration, _ = measure(lambda: distancevolume.save_image(filepath, "png", data, data.shape[1], data.shape[0]), repetitions)
+            result["png"] += duration
+            result["pngBytes"] += sum(os.path.getsize("{0}_{1}.png".format(filepath, bits)) for bits in ("low", "high"))
+    return result
+
+
+def main(argv):
+    options = {
+        "volume_resolutions": [32, 64, 128, 256],
+        "sensors": 2,
+        "rooms_x": 3,
+        "rooms_y": 2,
+        "flooding_directions": FLOODING_DIRECTIONS,
+        "propagation_methodes": ["DIJKSTRA"],
+        "occlusion_methode": "MESH",
+        "repetitions": 1,
+        "seed": 0,
+        "output": None,
+    }
+
+    try:
+        opts, args = getopt.getopt(argv, "hr:s:x:y:f:p:m:n:o:", [
+            "resolutions=",
+            "sensors=",
+            "rooms-x=",
+            "rooms-y=",
+            "flooding-directions=",
+            "propagation=",
+            "occlusion=",
+            "repetitions=",
+            "seed=",
+            "output=",
+        ])
+    except getopt.GetoptError as err:
+        print(USAGE)
+        print(err)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == '-h':
+            print(USAGE)
+            sys.exit()
+        elif opt in ("-r", "--resolutions"):
+            options["volume_resolutions"] = [int(value) for value in arg.split(",") if value != ""]
+        elif opt in ("-s", "--sensors"):
+            options["sensors"] = int(arg)
+        elif opt in ("-x", "--rooms-x"):
+            options["rooms_x"] = int(arg)
+        elif opt in ("-y", "--rooms-y"):
+            options["rooms_y"] = int(arg)
+        elif opt in ("-f", "--flooding-directions"):
+            options["flooding_directions"] = [value for value in arg.split(",") if value != ""]
+        elif opt in ("-p", "--propagation"):
+            options["propagation_methodes"] = [value for value in arg.split(",") if value != ""]
+        elif opt in ("-m", "--occlusion"):
+            options["occlusion_methode"] = arg
+        elif opt in ("-n", "--repetitions"):
+            options["repetitions"] = max(int(arg), 1)
+        elif opt == "--seed":
+            options["seed"] = int(arg)
+        elif opt in ("-o", "--output"):
+            options["output"] = arg
+
+    triangles, sensor_positions = generate_floor_plan(options["rooms_x"], options["rooms_y"], options["sensors"], options["seed"])
+    report = {
+        "version": BENCHMARK_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "processors": os.cpu_count(),
+        },
+        "floorPlan": {
+            "roomsX": options["rooms_x"],
+            "roomsY": options["rooms_y"],
+            "seed": options["seed"],
+            "triangles": len(triangles),
+            "sensorPositions": sensor_positions,
+        },
+        "occlusion": options["occlusion_methode"],
+        "repetitions": options["repetitions"],
+        "results": [],
+    }
+    for volume_resolution in options["volume_resolutions"]:
+        print("volume resolution {0}".format(volume_resolution), file=sys.stderr)
+        report["results"].append(benchmark_resolution(triangles, sensor_positions, volume_resolution, options))
+
+    if options["output"] is None:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    else:
+        with open(options["output"], "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=4)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
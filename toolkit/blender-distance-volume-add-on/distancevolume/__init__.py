@@ -0,0 +1,57 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# The baking core of the add-on, which depends on NumPy and Pillow only (but not on bpy, bmesh, or mathutils), so that
+# it can also be used from ordinary Python processes, e.g.:
+# sys.path.insert(0, "toolkit/blender-distance-volume-add-on")
+# from distancevolume import bake, save_texture
+
+from . baking import (
+    bake,
+    bake_distance_volume,
+    bake_distance_volumes,
+    calculate_dimensions,
+    calculate_occlusion,
+    get_cell,
+    get_step_widths,
+    pad_sensor_positions
+)
+from . bricks import BRICK_SIZE, CONSTANT_BRICK, brick_volume, unbrick_volume
+from . cache import calculate_cached_occlusion, evict_cached_occlusions, get_geometry_hash
+from . container import CONTAINER_NAME, load_container, save_container
+from . manifest import get_bake_settings, get_sensor_inputs, is_up_to_date, load_manifest, save_manifest
+from . mipmap import build_mip_chain, downsample_volume, get_mip_name
+from . nearest import MAX_NEAREST_SENSORS, NO_SENSOR, propagate_nearest
+from . occlusion import calculate_occlusion_mask, find_cells_near_triangles, find_nearest_on_triangles
+from . parallel import WorkerPool, get_worker_count
+from . profiling import PROFILE_NAME, BakeCancelled, BakeProfile, BakeStage
+from . propagation import propagate
+from . quantization import (
+    QUANTIZATION_NAME,
+    get_quantized_files,
+    load_quantization,
+    quantize_distances,
+    save_quantization,
+    save_quantized_texture
+)
+from . rasterization import (
+    NO_TRIANGLE,
+    dilate_texels,
+    get_cached_texel_positions,
+    get_texel_distances,
+    get_texel_positions,
+    interpolate_texels,
+    rasterize_triangles
+)
+from . texture import encode_preview, encode_texture, save_image, save_nearest_textures, save_texture
+from . volume import FREE, OCCLUDED, INSIDE_WALL, create_distances, create_state
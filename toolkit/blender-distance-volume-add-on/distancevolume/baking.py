@@ -0,0 +1,156 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time, types, numpy
+
+from . occlusion import calculate_occlusion_mask, find_nearest_on_triangles
+from . parallel import bake_sensors_in_parallel, get_worker_count
+from . propagation import propagate
+from . volume import create_distances, create_state
+
+
+def calculate_dimensions(vertices, volume_resolution, vertical_resolution = 0):
+    """Returns the bounding box of the vertices and the volume’s resolution, whose largest axis has volume_resolution cells.
+
+    A vertical_resolution overrides the number of cells along z, e.g., to bake flat buildings with few vertical cells.
+    """
+    vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+    bounding_box = types.SimpleNamespace()
+    bounding_box.min = vertices.min(axis=0).tolist()
+    bounding_box.max = vertices.max(axis=0).tolist()
+    dimensions = [bounding_box.max[i] - bounding_box.min[i] for i in range(0, 3)]
+
+    max_dim = max(dimensions)
+    resolution = list(map(lambda x: int(x / max_dim * volume_resolution), dimensions))
+    if vertical_resolution > 0:
+        resolution[2] = vertical_resolution
+    return bounding_box, resolution
+
+
+def get_step_widths(bounding_box, resolution):
+    return [((bounding_box.max[i] - bounding_box.min[i]) / resolution[i]) for i in range(0, 3)]
+
+
+def get_cell(position, bounding_box, resolution):
+    # Note the behaviour of int() in Python, i. e., that numbers get rounded down towards null (negative values: rounded up, positives values: rounded down)
+    # int(0.0 * 8) # right _at_ the bounding_box.min corner
+    # 0
+    # int(0.124 * 8) # right before the step from cell 0 to cell 1
+    # 0
+    # int(0.126 * 8) # right after the step from cell 0 to cell 1
+    # 1
+    # int(0.249 * 8) # right before the step from cell 1 to cell 2
+    # 1
+    # int(0.250 * 8) # right _at_ the step from cell 1 to cell 2
+    # 2
+    # int(0.251 * 8) # right after the step from cell 1 to cell 2
+    # 2
+    # int(0.874 * 8) # right before the step from cell 6 to cell 7 (last cell)
+    # 6
+    # int(0.876 * 8) # right after the step from cell 6 to cell 7 (last cell)
+    # 7
+    # int(0.999 * 8) # right before the bounding_box.max corner
+    # 7
+    # int(1.0 * 8) # right _at_ the bounding_box.max corner (Attention! This overflows the cells indices; thus, a min(resolution[i] - 1, …) is necessary!)
+    # 8
+    return [min(int((position[i] - bounding_box.min[i]) / (bounding_box.max[i]-bounding_box.min[i]) * (resolution[i])), resolution[i] - 1) for i in range(0, 3)]
+
+
+def calculate_occlusion(triangles, bounding_box, resolution, occlusion_methode = "MESH", find_nearest = None, progress = None):
+    """Returns the state array of the volume, with the cells occupied by the triangles marked as occluded"""
+    return create_state(calculate_occlusion_mask(triangles, bounding_box, resolution, occlusion_methode, find_nearest, progress))
+
+
+def pad_sensor_positions(positions, triangles, bounding_box, resolution, find_nearest = None):
+    """Returns the sensor positions, moved away from obstacles closer than one step (see calculate_occlusion)"""
+    # FIXME: When a sensor is too close to not only one but multiple walls/obstacles,
+    # FIXME: it is currently padded only away orthogonally from one of the obstacles
+    # FIXME: (i. e., the closest one). Make sure that it is padded away from _all_
+    # FIXME: obstacles which are too close to it.
+    positions = numpy.array(positions, dtype=numpy.float64).reshape(-1, 3)
+    if len(positions) == 0:
+        return positions
+    if find_nearest is None:
+        find_nearest = find_nearest_on_triangles(triangles)
+
+    step_widths = numpy.array(get_step_widths(bounding_box, resolution))
+    points, normals = find_nearest(positions)
+    for index, world_point in enumerate(positions):
+        p2 = numpy.subtract(points[index], world_point)
+        dist = numpy.linalg.norm(p2)
+        offset_direction = numpy.array(normals[index], dtype=numpy.float64)
+        offset_direction /= numpy.linalg.norm(offset_direction)
+        # One step along the obstacle’s normal, i. e., the extent of a (not necessarily cubic) cell in that direction
+        dist_treshold = numpy.linalg.norm(offset_direction * step_widths)
+        if dist <= dist_treshold:
+            v = numpy.dot(p2, normals[index])
+            offset_length = (dist_treshold - dist) + 0.01
+            if v >= 0.0:
+                # sensor lies within obstacle
+                offset_direction = -offset_direction
+            # else:
+                # sensor is outside of obstacle, but within dist_threshold
+            positions[index] = world_point + offset_direction * offset_length
+    return positions
+
+
+def bake_distance_volume(state, cells, step_width, flooding_directions = "DIAGONAL", propagation_methode = "DIJKSTRA", progress = None):
+    """Floods the volume from the given cells and returns its distances, its state and the propagation counters"""
+    distances = create_distances(state.shape)
+    state = state.copy()
+    counters = propagate(distances, state, cells, flooding_directions, propagation_methode, step_width, progress)
+    return distances, state, counters
+
+
+def bake_distance_volumes(state, cells, step_width, flooding_directions = "DIAGONAL", propagation_methode = "DIJKSTRA", workers = 1, progress = None, pool = None):
+    """Yields (index, distances, state, counters, seconds) for each sensor cell, either one after another or, for more
+    than one worker (0: one per CPU core), from a pool of worker processes, with the seconds spent on the sensor.
+
+    progress is passed on to propagate when baking one after another; parallel workers do not report their progress.
+    pool optionally is a WorkerPool (with the same settings) forked beforehand, which is used instead of a new one.
+    """
+    worker_count = get_worker_count(workers, len(cells))
+    if worker_count == 1:
+        for index, cell in enumerate(cells):
+            start_time = time.perf_counter()
+            distances, sensor_state, counters = bake_distance_volume(
+                state, [cell], step_width, flooding_directions, propagation_methode, progress
+            )
+            yield index, distances, sensor_state, counters, time.perf_counter() - start_time
+        return
+
+    for result in bake_sensors_in_parallel(state, cells, flooding_directions, propagation_methode, step_width, worker_count, pool):
+        yield result
+
+
+def bake(triangles, sensor_positions, volume_resolution = 64, occlusion_methode = "MESH", flooding_directions = "DIAGONAL", propagation_methode = "DIJKSTRA", workers = 1, pad_sensors = True, vertical_resolution = 0):
+    """Bakes the distance volumes of all sensors within the obstacles given as (n, 3, 3) array of triangle corners.
+
+    Returns a namespace with the bounding_box, the resolution, the occlusion state and the list of (distances, state)
+    volumes of the sensors.
+    """
+    triangles = numpy.asarray(triangles, dtype=numpy.float64).reshape(-1, 3, 3)
+    bounding_box, resolution = calculate_dimensions(triangles, volume_resolution, vertical_resolution)
+    find_nearest = find_nearest_on_triangles(triangles)
+    if pad_sensors:
+        sensor_positions = pad_sensor_positions(sensor_positions, triangles, bounding_box, resolution, find_nearest)
+
+    state = calculate_occlusion(triangles, bounding_box, resolution, occlusion_methode, find_nearest)
+    cells = [get_cell(position, bounding_box, resolution) for position in sensor_positions]
+    volumes = [None] * len(cells)
+    for index, distances, sensor_state, _, _ in bake_distance_volumes(
+        state, cells, get_step_widths(bounding_box, resolution), flooding_directions, propagation_methode, workers
+    ):
+        volumes[index] = (distances, sensor_state)
+
+    return types.SimpleNamespace(bounding_box=bounding_box, resolution=resolution, state=state, volumes=volumes)
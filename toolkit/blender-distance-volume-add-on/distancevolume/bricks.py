@@ -0,0 +1,57 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy
+
+# Index entries with this bit set describe a brick whose cells all share the value in the lower 16 bits; such bricks
+# are not stored. The other entries hold the number of the stored brick.
+CONSTANT_BRICK = 1 << 31
+BRICK_SIZE = 8
+
+
+def get_brick_counts(shape, brick_size):
+    return [-(-size // brick_size) for size in shape]
+
+
+def brick_volume(values, brick_size = BRICK_SIZE):
+    """Splits a uint16 volume ([z][y][x]) into cubic bricks and returns the brick index ([z][y][x], uint32) and the
+    stored, i. e., non-constant, bricks ([brick][z][y][x], uint16)
+    """
+    counts = get_brick_counts(values.shape, brick_size)
+    # Repeating the border cells keeps bricks that are only partially covered by the volume constant
+    padded = numpy.pad(values, [(0, count * brick_size - size) for count, size in zip(counts, values.shape)], mode="edge")
+    bricks = padded.reshape(
+        counts[0], brick_size, counts[1], brick_size, counts[2], brick_size
+    ).transpose(0, 2, 4, 1, 3, 5).reshape(-1, brick_size, brick_size, brick_size)
+
+    cells = bricks.reshape(len(bricks), -1)
+    constant = (cells == cells[:, :1]).all(axis=1)
+    index = numpy.empty(len(bricks), dtype=numpy.uint32)
+    index[constant] = CONSTANT_BRICK | cells[constant, 0].astype(numpy.uint32)
+    index[~constant] = numpy.arange(numpy.count_nonzero(~constant), dtype=numpy.uint32)
+    return index.reshape(counts), numpy.ascontiguousarray(bricks[~constant])
+
+
+def unbrick_volume(index, bricks, shape, brick_size = BRICK_SIZE):
+    """Returns the uint16 volume of the given shape described by a brick index and the stored bricks"""
+    counts = index.shape
+    flat_index = index.reshape(-1)
+    constant = (flat_index & CONSTANT_BRICK) != 0
+
+    all_bricks = numpy.empty((len(flat_index), brick_size, brick_size, brick_size), dtype=numpy.uint16)
+    all_bricks[constant] = (flat_index[constant] & 0xFFFF).astype(numpy.uint16)[:, None, None, None]
+    all_bricks[~constant] = bricks[flat_index[~constant]]
+    padded = all_bricks.reshape(
+        counts[0], counts[1], counts[2], brick_size, brick_size, brick_size
+    ).transpose(0, 3, 1, 4, 2, 5).reshape(counts[0] * brick_size, counts[1] * brick_size, counts[2] * brick_size)
+    return numpy.ascontiguousarray(padded[:shape[0], :shape[1], :shape[2]])
@@ -0,0 +1,90 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import glob, hashlib, os, tempfile, zipfile, numpy
+
+from . baking import calculate_occlusion
+from . volume import OCCLUDED, create_state
+
+# Bump this whenever the classification of the cells changes, so that old entries are not reused
+OCCLUSION_CACHE_VERSION = 2
+# Number of cached occlusion volumes kept per cache directory; the least recently used ones are evicted first
+OCCLUSION_CACHE_ENTRIES = 8
+
+
+def get_geometry_hash(triangles):
+    return hashlib.sha1(numpy.ascontiguousarray(triangles, dtype=numpy.float64).tobytes()).hexdigest()
+
+
+def get_occlusion_cache_key(triangles, bounding_box, resolution, occlusion_methode):
+    key = hashlib.sha1()
+    key.update(get_geometry_hash(triangles).encode("utf-8"))
+    key.update(repr((OCCLUSION_CACHE_VERSION, list(bounding_box.min), list(bounding_box.max), list(resolution), occlusion_methode)).encode("utf-8"))
+    return key.hexdigest()
+
+
+def get_occlusion_cache_file(cache_path, key):
+    return os.path.join(cache_path, "occlusion_{0}.npz".format(key))
+
+
+def load_cached_occlusion(cache_path, key):
+    """Returns the cached state array for the key, or None if there is no (readable) entry"""
+    cache_file = get_occlusion_cache_file(cache_path, key)
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with numpy.load(cache_file) as entry:
+            shape = tuple(int(size) for size in entry["shape"])
+            count = shape[0] * shape[1] * shape[2]
+            occluded = numpy.unpackbits(entry["occluded"])[:count].astype(bool).reshape(shape)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        os.remove(cache_file)
+        return None
+
+    # Mark the entry as recently used
+    os.utime(cache_file)
+    return create_state(occluded)
+
+
+def store_cached_occlusion(cache_path, key, state, max_entries = OCCLUSION_CACHE_ENTRIES):
+    os.makedirs(cache_path, exist_ok=True)
+    # Write to a temporary file first, so that concurrent bakes never read a partially written entry
+    descriptor, temporary_file = tempfile.mkstemp(suffix=".tmp", dir=cache_path)
+    with os.fdopen(descriptor, "wb") as cache_file:
+        numpy.savez_compressed(cache_file, shape=numpy.array(state.shape), occluded=numpy.packbits(state.ravel() == OCCLUDED))
+    os.replace(temporary_file, get_occlusion_cache_file(cache_path, key))
+    evict_cached_occlusions(cache_path, max_entries)
+
+
+def evict_cached_occlusions(cache_path, max_entries = OCCLUSION_CACHE_ENTRIES):
+    cache_files = sorted(glob.glob(os.path.join(cache_path, "occlusion_*.npz")), key=os.path.getmtime, reverse=True)
+    for cache_file in cache_files[max_entries:]:
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+
+
+def calculate_cached_occlusion(cache_path, triangles, bounding_box, resolution, occlusion_methode = "MESH", find_nearest = None, progress = None):
+    """Like calculate_occlusion, but reuses the state stored in cache_path for the same triangles and settings.
+
+    Returns the state array and whether it was loaded from the cache.
+    """
+    key = get_occlusion_cache_key(triangles, bounding_box, resolution, occlusion_methode)
+    state = load_cached_occlusion(cache_path, key)
+    if state is not None:
+        return state, True
+
+    state = calculate_occlusion(triangles, bounding_box, resolution, occlusion_methode, find_nearest, progress)
+    store_cached_occlusion(cache_path, key, state)
+    return state, False
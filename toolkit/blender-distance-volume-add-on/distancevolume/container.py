@@ -0,0 +1,132 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# A container holds the distance volumes of all sensors (and the outside volume) of a building in a single file:
+#
+#   bytes 0–3    magic "RCDV"
+#   bytes 4–7    format version (uint32, little endian)
+#   bytes 8–11   length of the header (uint32, little endian)
+#   bytes 12–…   header (UTF-8 encoded JSON)
+#
+# The data section starts at the next multiple of 8 bytes after the header. The header lists the volumes with their
+# offsets (relative to the data section) and byte lengths. Each volume holds resolution[0] × resolution[1] ×
+# resolution[2] uint16 values (little endian), ordered by slice (z), row and column (x), with the rows of each slice in
+# the same top-down order as in the PNG textures, so that they can be uploaded as they are to a 3D texture. With
+# "deflate" compression, each volume is a zlib stream of these values.
+#
+# Volumes with a "bricks" entry are split into cubic bricks of "size" cells along each axis (see brick_volume), with
+# "count" bricks along x, y, and z. Their data holds the brick index (count[0] × count[1] × count[2] uint32 values,
+# little endian, ordered like the cells) followed by the "stored" bricks (size³ uint16 values each). Index entries with
+# the highest bit set describe constant bricks, whose value is held in their lower 16 bits; the others hold the number
+# of the stored brick. The "quantization" of a volume's entry (if any)
+# holds its bits, scale, and offset, i. e., distance = offset + value × scale; otherwise, distance = value × maxDistance
+# / 65535.
+
+import collections, json, os, struct, tempfile, zlib, numpy
+
+from . bricks import brick_volume, unbrick_volume
+from . texture import get_max_distance
+
+CONTAINER_MAGIC = b"RCDV"
+CONTAINER_VERSION = 1
+CONTAINER_NAME = "distance-volumes.rcdv"
+CONTAINER_ALIGNMENT = 8
+
+
+def align(offset):
+    return (offset + CONTAINER_ALIGNMENT - 1) // CONTAINER_ALIGNMENT * CONTAINER_ALIGNMENT
+
+
+def save_container(filepath, volumes, bounding_box, compress = True, quantizations = None, brick_size = 0, progress = None):
+    """Saves the volumes (name → uint16 values as returned by quantize_distances, as [z][row][x] with
+    the rows in the textures’ (flipped) order, all of the same shape) as a container.
+
+    quantizations optionally maps the names to the volumes’ quantization (see quantize_distances), which is stored in
+    their header entries. With a brick_size, the volumes are stored as sparse bricks, omitting the constant ones.
+    progress (optional) is called with the number of volumes encoded so far, before anything is written.
+    """
+    resolution = None
+    entries = []
+    payloads = []
+    offset = 0
+    for name, values in volumes.items():
+        if progress is not None:
+            progress(len(entries))
+        if resolution is None:
+            resolution = values.shape[::-1]
+        elif values.shape[::-1] != resolution:
+            raise ValueError("All volumes of a container need to have the same resolution")
+        if brick_size > 0:
+            index, bricks = brick_volume(values, brick_size)
+            payload = numpy.ascontiguousarray(index, dtype="<u4").tobytes() + numpy.ascontiguousarray(bricks, dtype="<u2").tobytes()
+        else:
+            payload = numpy.ascontiguousarray(values, dtype="<u2").tobytes()
+        if compress:
+            payload = zlib.compress(payload, 9)
+        entry = {"name": name, "offset": offset, "byteLength": len(payload)}
+        if brick_size > 0:
+            entry["bricks"] = {"size": brick_size, "count": [int(count) for count in index.shape[::-1]], "stored": len(bricks)}
+        if quantizations is not None and name in quantizations:
+            entry["quantization"] = quantizations[name]
+        entries.append(entry)
+        payloads.append(payload)
+        offset = align(offset + len(payload))
+
+    header = json.dumps({
+        "resolution": [int(size) for size in resolution] if resolution is not None else [0, 0, 0],
+        "boundingBox": {"min": [float(value) for value in bounding_box.min], "max": [float(value) for value in bounding_box.max]},
+        "maxDistance": float(get_max_distance(bounding_box)),
+        "compression": "deflate" if compress else "none",
+        "volumes": entries,
+    }).encode("utf-8")
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_file = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    with os.fdopen(descriptor, "wb") as container_file:
+        prefix = CONTAINER_MAGIC + struct.pack("<II", CONTAINER_VERSION, len(header)) + header
+        container_file.write(prefix + bytes(align(len(prefix)) - len(prefix)))
+        for payload in payloads:
+            container_file.write(payload + bytes(align(len(payload)) - len(payload)))
+    os.replace(temporary_file, filepath)
+
+
+def load_container(filepath):
+    """Returns the header and the volumes (name → uint16 array, indexed as [z][row][x]) of a container"""
+    with open(filepath, "rb") as container_file:
+        data = container_file.read()
+    if len(data) < 12 or data[0:4] != CONTAINER_MAGIC:
+        raise ValueError("{0} is not a distance volume container".format(filepath))
+    version, header_length = struct.unpack("<II", data[4:12])
+    if version != CONTAINER_VERSION:
+        raise ValueError("{0} has the unsupported container version {1}".format(filepath, version))
+    header = json.loads(data[12:12 + header_length].decode("utf-8"))
+
+    data_offset = align(12 + header_length)
+    shape = tuple(header["resolution"][::-1])
+    volumes = collections.OrderedDict()
+    for entry in header["volumes"]:
+        start = data_offset + entry["offset"]
+        payload = data[start:start + entry["byteLength"]]
+        if header["compression"] == "deflate":
+            payload = zlib.decompress(payload)
+        if "bricks" in entry:
+            brick_size = entry["bricks"]["size"]
+            counts = tuple(entry["bricks"]["count"][::-1])
+            index_length = 4 * counts[0] * counts[1] * counts[2]
+            index = numpy.frombuffer(payload[:index_length], dtype="<u4").reshape(counts)
+            bricks = numpy.frombuffer(payload[index_length:], dtype="<u2").reshape(-1, brick_size, brick_size, brick_size)
+            volumes[entry["name"]] = unbrick_volume(index, bricks, shape, brick_size)
+        else:
+            volumes[entry["name"]] = numpy.frombuffer(payload, dtype="<u2").reshape(shape)
+    return header, volumes
@@ -0,0 +1,74 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json, os, tempfile
+
+# The manifest records the inputs each exported texture was baked from, so that rebakes can skip unchanged outputs
+MANIFEST_NAME = "bake-manifest.json"
+MANIFEST_VERSION = 2
+
+
+def load_manifest(output_path):
+    """Returns the outputs recorded in the manifest of the output directory (empty if there is none or it is outdated)"""
+    try:
+        with open(os.path.join(output_path, MANIFEST_NAME), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("outputs", {})
+
+
+def save_manifest(output_path, outputs):
+    os.makedirs(output_path, exist_ok=True)
+    descriptor, temporary_file = tempfile.mkstemp(suffix=".tmp", dir=output_path)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as manifest_file:
+        json.dump({"version": MANIFEST_VERSION, "outputs": outputs}, manifest_file, indent=4, sort_keys=True)
+    os.replace(temporary_file, os.path.join(output_path, MANIFEST_NAME))
+
+
+def get_bake_settings(bounding_box, resolution, flooding_directions, propagation_methode, occlusion_methode, quantization = None):
+    settings = {
+        "bounding_box_min": list(bounding_box.min),
+        "bounding_box_max": list(bounding_box.max),
+        "resolution": list(resolution),
+        "flooding_directions": flooding_directions,
+        "propagation_methode": propagation_methode,
+        "occlusion_methode": occlusion_methode,
+    }
+    # Only recorded if set, so that the outputs of bakes without quantization settings stay up to date
+    if quantization is not None:
+        settings["quantization"] = quantization
+    return settings
+
+
+def get_sensor_inputs(geometry_hash, settings, cell, position):
+    # The position is recorded for reference only; moving a sensor within its cell does not change its volume
+    return {
+        "geometry": geometry_hash,
+        "settings": settings,
+        "cell": [int(index) for index in cell],
+        "position": [float(coordinate) for coordinate in position],
+    }
+
+
+def is_up_to_date(outputs, output_path, name, inputs, files):
+    """Returns whether the output was baked from the same inputs and all of its files still exist"""
+    recorded = outputs.get(name)
+    if recorded is None:
+        return False
+    for key in ("geometry", "settings", "cell"):
+        if recorded.get(key) != inputs[key]:
+            return False
+    return all(os.path.isfile(os.path.join(output_path, file)) for file in files)
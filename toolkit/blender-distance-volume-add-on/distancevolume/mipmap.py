@@ -0,0 +1,61 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy
+
+from . volume import FREE, OCCLUDED, INSIDE_WALL
+
+
+def block_view(values, factor, mode):
+    """Returns the values padded to multiples of factor along each axis and split into [z][y][x] blocks of factor³ cells"""
+    counts = [-(-size // factor) for size in values.shape]
+    padded = numpy.pad(values, [(0, count * factor - size) for count, size in zip(counts, values.shape)], mode=mode)
+    return padded.reshape(counts[0], factor, counts[1], factor, counts[2], factor).transpose(0, 2, 4, 1, 3, 5).reshape(counts + [-1])
+
+
+def get_mip_name(name, level):
+    return "{0}_mip{1}".format(name, level)
+
+
+def downsample_volume(distances, state):
+    """Returns the distances and state ([z][y][x]) at half the resolution (rounded up) along each axis.
+
+    Each cell receives the mean distance of its free, reached cells, so that the distances within walls (and of
+    unreached cells) do not blur those of the free space. Cells without free cells receive the smallest distance of
+    their cells within walls and are occluded.
+    """
+    free = block_view(state == FREE, 2, "edge")
+    blocks = block_view(distances, 2, "edge")
+    reached = free & numpy.isfinite(blocks)
+    count = numpy.count_nonzero(reached, axis=-1)
+    mean = numpy.where(reached, blocks, 0.0).sum(axis=-1) / numpy.maximum(count, 1)
+
+    any_free = free.any(axis=-1)
+    downsampled_distances = numpy.where(count > 0, mean, numpy.where(any_free, numpy.inf, blocks.min(axis=-1)))
+    downsampled_state = numpy.where(
+        any_free, FREE, numpy.where((block_view(state, 2, "edge") == INSIDE_WALL).any(axis=-1), INSIDE_WALL, OCCLUDED)
+    )
+    return downsampled_distances.astype(numpy.float32), downsampled_state.astype(numpy.uint8)
+
+
+def build_mip_chain(distances, state, levels):
+    """Returns the (distances, state) of up to the given number of successively downsampled levels, stopping at a
+    single cell
+    """
+    chain = []
+    for level in range(0, levels):
+        if max(distances.shape) <= 1:
+            break
+        distances, state = downsample_volume(distances, state)
+        chain.append((distances, state))
+    return chain
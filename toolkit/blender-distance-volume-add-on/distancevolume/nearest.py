@@ -0,0 +1,130 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import collections, heapq, numpy
+
+from . propagation import BORDER, PADDING, chamfer_neighbours, flat_offsets, flat_seeds, pad_volume
+from . volume import FREE, INSIDE_WALL
+
+# The packed textures hold the nearest sensors in their RGBA channels
+MAX_NEAREST_SENSORS = 4
+# Sensor index of empty slots (unreached cells, or fewer reachable sensors than slots)
+NO_SENSOR = 255
+
+
+def propagate_nearest(state, seeds, nearest_count, flooding_directions, step_width, progress = None):
+    """Floods the distances from all sensors at once and returns, per cell, the distances to and indices of the
+    nearest_count nearest sensors (both indexed as [slot][z][y][x], sorted by increasing distance), the state and counters.
+
+    seeds holds one cell ([x, y, z]) per sensor. Every cell keeps a table of its best candidates from distinct sensors;
+    an offer that is farther than all of them cannot be among the nearest ones and is dropped, so that each cell is
+    settled at most nearest_count times.
+    """
+    if flooding_directions == "FAST_MARCHING":
+        print("Fast marching does not support nearest sensor volumes; using the Diagonal (L2, 5×5) flood directions instead.")
+        flooding_directions = "DIAGONAL_5"
+    if len(seeds) > NO_SENSOR:
+        raise ValueError("At most {0} sensors are supported by nearest sensor volumes".format(NO_SENSOR))
+
+    padded_distances, padded_state = pad_volume(numpy.zeros(state.shape, dtype=numpy.float32), state)
+    padded_shape = padded_distances.shape
+    size = padded_distances.size
+    offsets = flat_offsets(chamfer_neighbours(flooding_directions), padded_shape, step_width)
+    slots = range(0, nearest_count)
+
+    candidate_distances = numpy.full((nearest_count, size), numpy.inf, dtype=numpy.float32)
+    candidate_sensors = numpy.full((nearest_count, size), NO_SENSOR, dtype=numpy.uint8)
+    settled_slots = numpy.zeros(size, dtype=numpy.uint8)
+    distances = [memoryview(candidate_distances[slot]) for slot in slots]
+    sensors = [memoryview(candidate_sensors[slot]) for slot in slots]
+    settled = memoryview(settled_slots)
+    state = memoryview(padded_state.reshape(-1))
+
+    counters = collections.OrderedDict([("reached", 0), ("settled", 0), ("pushes", 0), ("pops", 0), ("outdated_pops", 0), ("dropped_offers", 0)])
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+    heap = []
+
+    def offer(cell, sensor, value):
+        """Enters a candidate into the cell’s table and returns the slot if it has to be (re-)propagated"""
+        worst = None
+        for slot in slots:
+            if sensors[slot][cell] == sensor:
+                if settled[cell] & (1 << slot) or value >= distances[slot][cell]:
+                    return None
+                worst = slot
+                break
+            if not settled[cell] & (1 << slot) and (worst is None or distances[slot][cell] > distances[worst][cell]):
+                worst = slot
+        if worst is None or value >= distances[worst][cell]:
+            counters["dropped_offers"] += 1
+            return None
+        distances[worst][cell] = value
+        sensors[worst][cell] = sensor
+        return worst
+
+    for sensor, cell in enumerate(flat_seeds(seeds, padded_shape)):
+        if state[cell] == BORDER:
+            continue
+        slot = offer(cell, sensor, 0.0)
+        if slot is None:
+            continue
+        if state[cell] != FREE:
+            state[cell] = INSIDE_WALL
+            continue
+        heap.append((0.0, cell, sensor))
+    heapq.heapify(heap)
+    counters["pushes"] = len(heap)
+
+    while len(heap) > 0:
+        current_value, cell, sensor = heappop(heap)
+        counters["pops"] += 1
+        for slot in slots:
+            if sensors[slot][cell] == sensor:
+                break
+        else:
+            slot = None
+        if slot is None or settled[cell] & (1 << slot) or current_value > distances[slot][cell]:
+            # The candidate has been replaced by nearer sensors, or settled with a shorter distance already
+            counters["outdated_pops"] += 1
+            continue
+        if settled[cell] == 0:
+            counters["reached"] += 1
+            if progress is not None and counters["reached"] % 1024 == 0:
+                progress(counters["reached"])
+        settled[cell] |= 1 << slot
+        counters["settled"] += 1
+
+        for offset, weight in offsets:
+            neighbour = cell + offset
+            neighbour_state = state[neighbour]
+            if neighbour_state == BORDER:
+                continue
+            neighbour_slot = offer(neighbour, sensor, current_value + weight)
+            if neighbour_slot is None:
+                continue
+            if neighbour_state != FREE:
+                # Cells within walls keep their nearest candidates, but never propagate them
+                state[neighbour] = INSIDE_WALL
+                continue
+            heappush(heap, (distances[neighbour_slot][neighbour], neighbour, sensor))
+            counters["pushes"] += 1
+
+    # Sort the slots of each cell by distance and strip the padding
+    inner = (slice(None),) + (slice(PADDING, -PADDING),) * 3
+    candidate_distances = candidate_distances.reshape((nearest_count,) + padded_shape)[inner]
+    candidate_sensors = candidate_sensors.reshape((nearest_count,) + padded_shape)[inner]
+    order = numpy.argsort(candidate_distances, axis=0, kind="stable")
+    nearest_distances = numpy.take_along_axis(candidate_distances, order, axis=0)
+    nearest_sensors = numpy.take_along_axis(candidate_sensors, order, axis=0)
+    return nearest_distances, nearest_sensors, padded_state[inner[1:]].copy(), counters
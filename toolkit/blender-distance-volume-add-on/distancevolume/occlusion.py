@@ -0,0 +1,289 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy
+
+# Upper bound for the number of (triangle, voxel) pairs that are tested at once
+PAIRS_PER_CHUNK = 1 << 18
+
+
+def cell_centers(bounding_box, resolution, axis):
+    """Returns the world coordinates of the cell mid-points along one axis of the grid"""
+    minimum = bounding_box.min[axis]
+    maximum = bounding_box.max[axis]
+    return ((numpy.arange(resolution[axis], dtype=numpy.float64) + 0.5) / resolution[axis]) * (maximum - minimum) + minimum
+
+
+def closest_points_on_triangles(points, a, b, c):
+    """Returns the closest point on each triangle (a[i], b[i], c[i]) to points[i]"""
+    # Adapted from Christer Ericson. "Real-Time Collision Detection", Section 5.1.5, 2005.
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+    d1 = numpy.einsum("ij,ij->i", ab, ap)
+    d2 = numpy.einsum("ij,ij->i", ac, ap)
+    d3 = numpy.einsum("ij,ij->i", ab, bp)
+    d4 = numpy.einsum("ij,ij->i", ac, bp)
+    d5 = numpy.einsum("ij,ij->i", ab, cp)
+    d6 = numpy.einsum("ij,ij->i", ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        denominator = va + vb + vc
+        v = vb / denominator
+        w = vc / denominator
+        result = a + ab * v[:, None] + ac * w[:, None]
+
+        # The regions are applied in reverse order of their precedence, so that vertices win over edges over the face
+        edge_bc = (va <= 0.0) & (d4 - d3 >= 0.0) & (d5 - d6 >= 0.0)
+        t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        result = numpy.where(edge_bc[:, None], b + (c - b) * t[:, None], result)
+
+        edge_ac = (vb <= 0.0) & (d2 >= 0.0) & (d6 <= 0.0)
+        t = d2 / (d2 - d6)
+        result = numpy.where(edge_ac[:, None], a + ac * t[:, None], result)
+
+        result = numpy.where(((d6 >= 0.0) & (d5 <= d6))[:, None], c, result)
+
+        edge_ab = (vc <= 0.0) & (d1 >= 0.0) & (d3 <= 0.0)
+        t = d1 / (d1 - d3)
+        result = numpy.where(edge_ab[:, None], a + ab * t[:, None], result)
+
+        result = numpy.where(((d3 >= 0.0) & (d4 <= d3))[:, None], b, result)
+        result = numpy.where(((d1 <= 0.0) & (d2 <= 0.0))[:, None], a, result)
+
+    # Degenerated (zero-area) triangles may still produce NaNs; fall back to their first vertex
+    invalid = numpy.isnan(result).any(axis=1)
+    result[invalid] = a[invalid]
+    return result
+
+
+def triangle_cell_ranges(triangles, bounding_box, resolution, padding):
+    """Returns the inclusive ranges of cells whose mid-points lie within the padded bounds of each triangle"""
+    minimum = numpy.asarray(bounding_box.min, dtype=numpy.float64)
+    maximum = numpy.asarray(bounding_box.max, dtype=numpy.float64)
+    resolution = numpy.asarray(resolution)
+    step_widths = (maximum - minimum) / resolution
+
+    lower = (triangles.min(axis=1) - padding - minimum) / step_widths - 0.5
+    upper = (triangles.max(axis=1) + padding - minimum) / step_widths - 0.5
+    lower = numpy.clip(numpy.ceil(lower), 0, resolution - 1).astype(numpy.int64)
+    upper = numpy.clip(numpy.floor(upper), -1, resolution - 1).astype(numpy.int64)
+    return lower, upper
+
+
+def split_cell_ranges(lower, extents, budget):
+    """Splits cell ranges along z so that no single range covers more than budget cells"""
+    slab_cells = extents[:, 0] * extents[:, 1]
+    slabs_per_piece = numpy.maximum(1, budget // numpy.maximum(slab_cells, 1))
+    pieces = (extents[:, 2] + slabs_per_piece - 1) // slabs_per_piece
+
+    record = numpy.repeat(numpy.arange(len(lower)), pieces)
+    piece_index = numpy.arange(len(record)) - numpy.repeat(numpy.cumsum(pieces) - pieces, pieces)
+    piece_lower = lower[record].copy()
+    piece_extents = extents[record].copy()
+    piece_lower[:, 2] += piece_index * slabs_per_piece[record]
+    piece_extents[:, 2] = numpy.minimum(slabs_per_piece[record], extents[record, 2] - piece_index * slabs_per_piece[record])
+    return record, piece_lower, piece_extents
+
+
+def iterate_triangle_cell_pairs(triangles, bounding_box, resolution, padding, budget = PAIRS_PER_CHUNK):
+    """Yields chunks of (triangle index, cell index) pairs of all cells within the padded bounds of each triangle"""
+    if len(triangles) == 0:
+        return
+    lower, upper = triangle_cell_ranges(triangles, bounding_box, resolution, padding)
+    extents = upper - lower + 1
+    non_empty = numpy.all(extents > 0, axis=1)
+    triangle_indices = numpy.nonzero(non_empty)[0]
+    if len(triangle_indices) == 0:
+        return
+    record, lower, extents = split_cell_ranges(lower[non_empty], extents[non_empty], budget)
+    triangle_indices = triangle_indices[record]
+
+    counts = numpy.prod(extents, axis=1)
+    ends = numpy.cumsum(counts)
+    chunk_of_record = (ends - counts) // budget
+    boundaries = numpy.searchsorted(chunk_of_record, numpy.unique(chunk_of_record))
+    boundaries = numpy.append(boundaries, len(counts))
+
+    for first, last in zip(boundaries[:-1], boundaries[1:]):
+        chunk_counts = counts[first:last]
+        local_record = numpy.repeat(numpy.arange(last - first), chunk_counts)
+        local_index = numpy.arange(chunk_counts.sum()) - numpy.repeat(numpy.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+        chunk_extents = extents[first:last][local_record]
+        chunk_lower = lower[first:last][local_record]
+
+        x = local_index % chunk_extents[:, 0]
+        rest = local_index // chunk_extents[:, 0]
+        y = rest % chunk_extents[:, 1]
+        z = rest // chunk_extents[:, 1]
+        cells = numpy.stack((x, y, z), axis=1) + chunk_lower
+        yield triangle_indices[first:last][local_record], cells
+
+
+def cell_points(cells, centers):
+    return numpy.stack([centers[i][cells[:, i]] for i in range(0, 3)], axis=1)
+
+
+def flat_cell_indices(cells, resolution):
+    return (cells[:, 2] * resolution[1] + cells[:, 1]) * resolution[0] + cells[:, 0]
+
+
+def find_nearest_on_triangles(triangles, budget = PAIRS_PER_CHUNK):
+    """Returns a brute-force find_nearest function for the triangles, for use when no BVH tree is available.
+
+    It tests every point against every triangle, so prefer a BVH tree (e.g., Blender’s) for large meshes.
+    """
+    triangles = numpy.asarray(triangles, dtype=numpy.float64).reshape(-1, 3, 3)
+    normals = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = numpy.linalg.norm(normals, axis=1)
+    normals /= numpy.where(lengths > 0.0, lengths, 1.0)[:, None]
+
+    def find_nearest(points):
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        nearest = numpy.empty_like(points)
+        nearest_normals = numpy.empty_like(points)
+        points_per_chunk = max(1, budget // max(len(triangles), 1))
+        for first in range(0, len(points), points_per_chunk):
+            chunk = points[first:first + points_per_chunk]
+            repeated = numpy.repeat(chunk, len(triangles), axis=0)
+            corners = numpy.tile(triangles, (len(chunk), 1, 1))
+            closest = closest_points_on_triangles(repeated, corners[:, 0], corners[:, 1], corners[:, 2])
+            offsets = closest - repeated
+            squared_distances = numpy.einsum("ij,ij->i", offsets, offsets).reshape(len(chunk), len(triangles))
+            best = squared_distances.argmin(axis=1)
+            nearest[first:first + len(chunk)] = closest.reshape(len(chunk), len(triangles), 3)[numpy.arange(len(chunk)), best]
+            nearest_normals[first:first + len(chunk)] = normals[best]
+        return nearest, nearest_normals
+
+    return find_nearest
+
+
+def find_cells_near_triangles(triangles, bounding_box, resolution, distance, progress = None):
+    """Returns the cells ((n, 3) array of [x, y, z], ordered like the volume) whose mid-points lie within the distance
+    (in world units) of any of the triangles. Only the cells within the padded bounds of each triangle are tested.
+
+    progress (optional) is called with the number of triangles processed so far.
+    """
+    triangles = numpy.asarray(triangles, dtype=numpy.float64).reshape(-1, 3, 3)
+    centers = [cell_centers(bounding_box, resolution, i) for i in range(0, 3)]
+    near = numpy.zeros(resolution[0] * resolution[1] * resolution[2], dtype=bool)
+
+    for triangle_indices, cells in iterate_triangle_cell_pairs(triangles, bounding_box, resolution, distance):
+        processed = int(triangle_indices[-1]) + 1
+        flat = flat_cell_indices(cells, resolution)
+        # Cells that are already known to be near another triangle need not be tested again
+        unknown = ~near[flat]
+        triangle_indices, cells, flat = triangle_indices[unknown], cells[unknown], flat[unknown]
+        if len(flat) > 0:
+            points = cell_points(cells, centers)
+            corners = triangles[triangle_indices]
+            offsets = closest_points_on_triangles(points, corners[:, 0], corners[:, 1], corners[:, 2]) - points
+            near[flat[numpy.einsum("ij,ij->i", offsets, offsets) <= distance * distance]] = True
+        if progress is not None:
+            progress(processed)
+
+    return numpy.stack(numpy.unravel_index(numpy.nonzero(near)[0], (resolution[2], resolution[1], resolution[0]))[::-1], axis=1)
+
+
+def calculate_occlusion_mask(triangles, bounding_box, resolution, occlusion_methode, find_nearest = None, progress = None):
+    """Classifies all grid cells at once and returns a boolean mask, indexed as [z][y][x], of the occluded cells.
+
+    triangles is a (n, 3, 3) array of world space triangle corners. find_nearest maps an (m, 3) array of world points
+    to their nearest surface points and the normals of the corresponding faces (both (m, 3) arrays); it is only
+    consulted for three representatives of each run of cells along x that does not touch the obstacle surface (VOLUME
+    methode only) and defaults to a brute-force search over the triangles. progress (optional) is called with the number of
+    triangles processed so far.
+    """
+    triangles = numpy.asarray(triangles, dtype=numpy.float64).reshape(-1, 3, 3)
+    cell_count = resolution[0] * resolution[1] * resolution[2]
+    centers = [cell_centers(bounding_box, resolution, i) for i in range(0, 3)]
+
+    # The distances to the surface are measured in cells, i. e., with the coordinates divided by each axis’ step
+    # width, so that cells that are not cubic (e.g., with few cells along z) still seal the surface along all axes.
+    # The distance threshold is half of the grid’s step size (half of the distance between two cell mid-points)
+    step_widths = numpy.array([(bounding_box.max[i] - bounding_box.min[i]) / resolution[i] for i in range(0, 3)])
+    cell_triangles = triangles / step_widths
+    cell_centers_scaled = [centers[i] / step_widths[i] for i in range(0, 3)]
+    squared_treshold = 0.5 * 0.5
+
+    # Cells closer to the surface than the threshold; the nearest face of these is always within their padded bounds
+    near_surface = numpy.zeros(cell_count, dtype=bool)
+    if occlusion_methode != "MESH":
+        nearest_squared_distance = numpy.full(cell_count, numpy.inf)
+        behind_nearest_face = numpy.zeros(cell_count, dtype=bool)
+        normals = numpy.cross(cell_triangles[:, 1] - cell_triangles[:, 0], cell_triangles[:, 2] - cell_triangles[:, 0])
+
+    for triangle_indices, cells in iterate_triangle_cell_pairs(triangles, bounding_box, resolution, step_widths / 2.0):
+        points = cell_points(cells, cell_centers_scaled)
+        corners = cell_triangles[triangle_indices]
+        closest = closest_points_on_triangles(points, corners[:, 0], corners[:, 1], corners[:, 2])
+        offsets = closest - points
+        squared_distances = numpy.einsum("ij,ij->i", offsets, offsets)
+        if progress is not None:
+            progress(int(triangle_indices[-1]) + 1)
+
+        hits = squared_distances <= squared_treshold
+        flat = flat_cell_indices(cells[hits], resolution)
+        near_surface[flat] = True
+        if occlusion_methode == "MESH":
+            continue
+
+        # Keep only the nearest face per cell (within this chunk first, then against the previous chunks)
+        squared_distances = squared_distances[hits]
+        behind = numpy.einsum("ij,ij->i", offsets[hits], normals[triangle_indices[hits]]) >= 0.0
+        order = numpy.lexsort((squared_distances, flat))
+        flat = flat[order]
+        first = numpy.ones(len(flat), dtype=bool)
+        first[1:] = flat[1:] != flat[:-1]
+        flat = flat[first]
+        squared_distances = squared_distances[order][first]
+        behind = behind[order][first]
+        closer = squared_distances < nearest_squared_distance[flat]
+        nearest_squared_distance[flat[closer]] = squared_distances[closer]
+        behind_nearest_face[flat[closer]] = behind[closer]
+
+    if occlusion_methode == "MESH":
+        return near_surface.reshape(resolution[2], resolution[1], resolution[0])
+
+    # Between two neighboring cells along x, the surface can only be crossed if one of them is closer than half a
+    # step to it. Hence, all cells of a run along x that lies entirely away from the surface share the same side.
+    near_surface = near_surface.reshape(-1, resolution[0])
+    run_starts = ~near_surface.copy()
+    run_starts[:, 1:] &= near_surface[:, :-1]
+    run_ends = ~near_surface.copy()
+    run_ends[:, :-1] &= near_surface[:, 1:]
+    starts = numpy.nonzero(run_starts.ravel())[0]
+    ends = numpy.nonzero(run_ends.ravel())[0]
+    if len(starts) == 0:
+        return behind_nearest_face.reshape(resolution[2], resolution[1], resolution[0])
+
+    # Classify each run by the majority of its first, middle and last cell to stay robust against single cells whose
+    # nearest surface point lies on an edge or vertex
+    # (see https://github.com/JacquesLucke/animation_nodes/issues/420)
+    samples = numpy.stack((starts, (starts + ends) // 2, ends), axis=1)
+    sample_cells = numpy.stack(numpy.unravel_index(samples.ravel(), (resolution[2], resolution[1], resolution[0]))[::-1], axis=1)
+    sample_points = cell_points(sample_cells, centers)
+    if find_nearest is None:
+        find_nearest = find_nearest_on_triangles(triangles)
+    nearest_points, nearest_normals = find_nearest(sample_points)
+    votes = numpy.einsum("ij,ij->i", numpy.asarray(nearest_points) - sample_points, numpy.asarray(nearest_normals)) >= 0.0
+    run_inside = votes.reshape(-1, 3).sum(axis=1) >= 2
+
+    run_ids = numpy.cumsum(run_starts.ravel()) - 1
+    occluded = numpy.where(near_surface.ravel(), behind_nearest_face, run_inside[numpy.maximum(run_ids, 0)])
+    return occluded.reshape(resolution[2], resolution[1], resolution[0])
@@ -0,0 +1,96 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing, os, time, numpy
+
+from . propagation import propagate
+from . volume import create_distances
+
+# The state of each worker process, set up once by initialize_worker
+worker = {}
+
+
+def parallel_baking_available():
+    # Workers are forked, since a spawned interpreter could neither import bpy nor find Blender’s Python executable
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def get_worker_count(configured_workers, job_count):
+    worker_count = configured_workers if configured_workers > 0 else (os.cpu_count() or 1)
+    worker_count = max(1, min(worker_count, job_count))
+    if worker_count > 1 and not parallel_baking_available():
+        print("Parallel baking is not supported on this platform; baking the sensors one after another.")
+        return 1
+    return worker_count
+
+
+def initialize_worker(state_buffer, shape, flooding_directions, propagation_methode, step_width):
+    worker["state"] = numpy.frombuffer(state_buffer, dtype=numpy.uint8).reshape(shape)
+    worker["settings"] = (flooding_directions, propagation_methode, step_width)
+
+
+def bake_sensor(job):
+    index, cell = job
+    start_time = time.perf_counter()
+    state = worker["state"].copy()
+    distances = create_distances(state.shape)
+    counters = propagate(distances, state, [cell], *worker["settings"])
+    return index, distances, state, counters, time.perf_counter() - start_time
+
+
+class WorkerPool:
+    """Worker processes that bake sensors from a shared occlusion state, which is only filled in by bake (e.g., after
+    forking the workers on an application’s main thread, since forking from other threads copies the locks held by the
+    remaining threads). Call terminate once done.
+    """
+
+    def __init__(self, shape, flooding_directions, propagation_methode, step_width, worker_count):
+        context = multiprocessing.get_context("fork")
+        self.shape = tuple(shape)
+        self.state_buffer = context.RawArray("B", int(numpy.prod(self.shape)))
+        self.pool = context.Pool(
+            worker_count, initialize_worker,
+            (self.state_buffer, self.shape, flooding_directions, propagation_methode, step_width)
+        )
+
+    def bake(self, state, cells):
+        """Yields (index, distances, state, counters, seconds) for each sensor cell as soon as one of the workers has finished
+        it, with the seconds the worker spent on it
+        """
+        # The workers copy the shared state for each sensor, so it can be replaced between the bakes
+        numpy.frombuffer(self.state_buffer, dtype=numpy.uint8)[:] = state.ravel()
+        for result in self.pool.imap_unordered(bake_sensor, enumerate(cells)):
+            yield result
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def bake_sensors_in_parallel(state, cells, flooding_directions, propagation_methode, step_width, worker_count, pool = None):
+    """Yields (index, distances, state, counters, seconds) for each sensor cell as soon as one of the workers has finished it.
+
+    The occlusion state is put into shared memory once; every worker copies it only for the sensors it bakes. Without a
+    (WorkerPool) pool, the workers are forked for this bake only.
+    """
+    if pool is not None:
+        for result in pool.bake(state, cells):
+            yield result
+        return
+
+    pool = WorkerPool(state.shape, flooding_directions, propagation_methode, step_width, worker_count)
+    try:
+        for result in pool.bake(state, cells):
+            yield result
+    finally:
+        pool.terminate()
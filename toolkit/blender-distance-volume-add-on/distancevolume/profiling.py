@@ -0,0 +1,170 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import collections, json, os, sys, tempfile, time
+
+PROFILE_NAME = "bake-profile.json"
+PROFILE_VERSION = 1
+# The progress line is written at most this often (in seconds), so that reporting the progress from hot loops is cheap
+PROGRESS_INTERVAL = 0.5
+
+
+class BakeCancelled(Exception):
+    """Raised by the stages of a cancelled bake as soon as they start or report their progress"""
+
+
+class BakeStage:
+    """Wall time and counters of one stage of a bake (optionally for a single sensor), which also reports its progress
+    towards the goal on the console. Use as context manager; see BakeProfile.stage.
+    """
+
+    def __init__(self, profile, name, sensor = None, goal = 1):
+        self.profile = profile
+        self.name = name
+        self.sensor = sensor
+        self.goal = max(goal, 1)
+        self.counters = collections.OrderedDict()
+        self.seconds = 0.0
+        self.done = 0
+        self.start_time = None
+        self.reported_time = 0.0
+
+    def __enter__(self):
+        if self.profile.cancelled:
+            raise BakeCancelled()
+        self.start_time = time.perf_counter()
+        self.profile.active = self
+        self.write_progress(0)
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.seconds = time.perf_counter() - self.start_time
+        self.profile.active = None
+        if exception_type is None:
+            self.write_progress(self.goal, True)
+        self.profile.stages.append(self)
+        return False
+
+    def get_title(self):
+        return self.name if self.sensor is None else "{0} ({1})".format(self.name, self.sensor)
+
+    def get_fraction(self):
+        return min(self.done / self.goal, 1.0)
+
+    def progress(self, done):
+        if self.profile.cancelled:
+            raise BakeCancelled()
+        self.done = done
+        now = time.perf_counter()
+        if now - self.reported_time >= PROGRESS_INTERVAL:
+            self.reported_time = now
+            self.write_progress(done)
+
+    def write_progress(self, done, finished = False):
+        self.done = done
+        if not self.profile.verbose:
+            return
+        progress = self.get_fraction()
+        block = int(round(20 * progress))
+        elapsed = time.perf_counter() - self.start_time
+        message = "\r{0}: [{1}] {2:.1f}% {3:.1f}s".format(self.get_title(), "#" * block + "-" * (20 - block), progress * 100, elapsed)
+        if finished:
+            message += " DONE\n"
+            if len(self.counters) > 0:
+                message += ", ".join("{0}: {1}".format(key, value) for key, value in self.counters.items()) + "\n"
+        self.profile.output.write(message)
+        self.profile.output.flush()
+
+    def count(self, name, value = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_counters(self, counters):
+        for name, value in counters.items():
+            self.count(name, value)
+
+    def to_json(self):
+        return {"stage": self.name, "sensor": self.sensor, "seconds": self.seconds, "counters": dict(self.counters)}
+
+
+class BakeProfile:
+    """Records the stages of a bake and writes them as JSON report, e.g.:
+
+    profile = BakeProfile("bake volume")
+    with profile.stage("calculate distances", sensor_name, goal=free_cells) as stage:
+        counters = propagate(…, stage.progress)
+        stage.add_counters(counters)
+    profile.save(output_path)
+
+    A bake running in another thread is stopped by cancel, which makes its current (or next) stage raise BakeCancelled.
+    """
+
+    def __init__(self, title, verbose = True, output = None):
+        self.title = title
+        self.verbose = verbose
+        self.output = output if output is not None else sys.stdout
+        self.stages = []
+        self.active = None
+        self.cancelled = False
+        self.started = time.time()
+        self.start_time = time.perf_counter()
+
+    def stage(self, name, sensor = None, goal = 1):
+        return BakeStage(self, name, sensor, goal)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def get_progress(self):
+        """Returns the title and the progress (0–1) of the current stage, or None between stages"""
+        stage = self.active
+        if stage is None:
+            return None
+        return stage.get_title(), stage.get_fraction()
+
+    def record(self, name, sensor = None, seconds = 0.0, counters = None):
+        """Adds a stage that was measured elsewhere, e.g., in a worker process"""
+        stage = BakeStage(self, name, sensor)
+        stage.seconds = seconds
+        stage.add_counters(counters or {})
+        self.stages.append(stage)
+        return stage
+
+    def get_totals(self):
+        totals = collections.OrderedDict()
+        for stage in self.stages:
+            total = totals.setdefault(stage.name, {"seconds": 0.0, "count": 0, "counters": collections.OrderedDict()})
+            total["seconds"] += stage.seconds
+            total["count"] += 1
+            for name, value in stage.counters.items():
+                total["counters"][name] = total["counters"].get(name, 0) + value
+        return totals
+
+    def to_json(self):
+        return {
+            "version": PROFILE_VERSION,
+            "title": self.title,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "seconds": time.perf_counter() - self.start_time,
+            "stages": [stage.to_json() for stage in self.stages],
+            "totals": self.get_totals(),
+        }
+
+    def save(self, output_path):
+        """Writes the report as bake-profile.json into the output directory and returns its path"""
+        os.makedirs(output_path, exist_ok=True)
+        filepath = os.path.join(output_path, PROFILE_NAME)
+        descriptor, temporary_file = tempfile.mkstemp(suffix=".tmp", dir=output_path)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as profile_file:
+            json.dump(self.to_json(), profile_file, indent=4)
+        os.replace(temporary_file, filepath)
+        return filepath
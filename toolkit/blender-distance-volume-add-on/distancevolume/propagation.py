@@ -0,0 +1,495 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import collections, heapq, itertools, math, numpy
+
+from . volume import FREE, INSIDE_WALL
+
+# The volumes are padded by this many cells (marked as BORDER) so that the neighbors of a cell never need bounds checks
+PADDING = 2
+BORDER = 255
+
+
+def chamfer_neighbours(flooding_directions):
+    """Returns the (dx, dy, dz, factor) offsets used for flooding, with factor in multiples of the step width"""
+    # Factors taken from https://kyamagu.github.io/mexopencv/matlab/distanceTransform.html
+    # (Also see: Gunilla Borgefors. "Distance transformations in digital images". Computer vision, graphics, and image processing, 34(3):344-371, 1986.)
+    direct_factor = 1.0
+    if flooding_directions == "DIAGONAL":
+        direct_factor = 0.955
+    neighbours = [
+        (1, 0, 0), (-1, 0, 0),
+        (0, 1, 0), (0, -1, 0),
+        (0, 0, 1), (0, 0, -1)
+    ]
+    neighbours = [offset + (direct_factor,) for offset in neighbours]
+
+    if flooding_directions == "DIAGONAL" or flooding_directions == "DIAGONAL_5":
+        l2_b_factor = 1.3693
+        if flooding_directions == "DIAGONAL_5":
+            l2_b_factor = 1.4
+        diagonal_neighbours = [
+            (1, 1, 0), (1, -1, 0),
+            (1, 0, 1), (1, 0, -1),
+            (-1, 1, 0), (-1, -1, 0),
+            (-1, 0, 1), (-1, 0, -1),
+            (0, 1, 1), (0, 1, -1), # light blue in the MagicaVoxel sketch
+            (0, -1, 1), (0, -1, -1), # light blue in the MagicaVoxel sketch
+        ]
+        neighbours += [offset + (l2_b_factor,) for offset in diagonal_neighbours]
+
+    if flooding_directions == "DIAGONAL_5":
+        l2_c_factor = 2.1969
+        next_neighbours = [
+            (2, 1, 0), (2, -1, 0), # yellow
+            (1, 2, 0), (1, -2, 0), # yellow
+            (-1, 2, 0), (-1, -2, 0), # yellow
+            (-2, 1, 0), (-2, -1, 0), # yellow
+            (-2, 0, 1), (2, 0, 1), # light yellow
+            (0, -2, 1), (0, 2, 1), # light yellow
+            (-1, 0, 2), (1, 0, 2), # light yellow
+            (0, -1, 2), (0, 1, 2), # light yellow
+            (-2, 0, -1), (2, 0, -1), # dark yellow
+            (0, -2, -1), (0, 2, -1), # dark yellow
+            (-1, 0, -2), (1, 0, -2), # dark yellow
+            (0, -1, -2), (0, 1, -2), # dark yellow
+        ]
+        neighbours += [offset + (l2_c_factor,) for offset in next_neighbours]
+
+    return neighbours
+
+
+def axis_step_widths(step_width):
+    """Returns the step widths along x, y and z for either a single (cubic cells) or a per-axis step width"""
+    if numpy.ndim(step_width) == 0:
+        return (float(step_width),) * 3
+    return tuple(float(width) for width in step_width)
+
+
+def weigh_neighbours(neighbours, step_width):
+    """Returns the (dx, dy, dz, weight) offsets with the distances of the neighbours for the given step width(s).
+
+    The chamfer factors are meant for cubic cells; they are applied as the ratio to the offset’s length, i. e., scale
+    the actual length of the offset for non-cubic cells.
+    """
+    step_x, step_y, step_z = axis_step_widths(step_width)
+    weighted = []
+    for dx, dy, dz, factor in neighbours:
+        cubic_length = math.sqrt(dx * dx + dy * dy + dz * dz)
+        length = math.sqrt((dx * step_x) ** 2 + (dy * step_y) ** 2 + (dz * step_z) ** 2)
+        weighted.append((dx, dy, dz, factor / cubic_length * length))
+    return weighted
+
+
+def pad_volume(distances, state):
+    padded_distances = numpy.pad(distances, PADDING, mode="constant", constant_values=numpy.inf)
+    padded_state = numpy.pad(state, PADDING, mode="constant", constant_values=BORDER)
+    return padded_distances, padded_state
+
+
+def unpad_volume(padded_distances, padded_state, distances, state):
+    inner = (slice(PADDING, -PADDING),) * 3
+    distances[...] = padded_distances[inner]
+    state[...] = padded_state[inner]
+
+
+def flat_offsets(neighbours, padded_shape, step_width):
+    """Returns (flat index offset, distance) pairs for the neighbours within a padded volume"""
+    return [((dz * padded_shape[1] + dy) * padded_shape[2] + dx, weight) for dx, dy, dz, weight in weigh_neighbours(neighbours, step_width)]
+
+
+def flat_seeds(seeds, padded_shape):
+    return [((z + PADDING) * padded_shape[1] + (y + PADDING)) * padded_shape[2] + (x + PADDING) for x, y, z in seeds]
+
+
+def propagate(distances, state, seeds, flooding_directions, propagation_methode, step_width, progress = None):
+    """Floods the distances from the seed cells ([x, y, z], starting at 0) through all free cells.
+
+    Free cells receive the length of the shortest chamfer path to a seed that only passes free cells (or, for the
+    FAST_MARCHING flooding directions, the solution of the Eikonal equation, i. e., the geodesic distance). Cells within
+    walls receive the smallest distance of a free neighbor (plus the step), but never propagate distances themselves.
+    step_width is either a single step width or the step widths along x, y and z. Returns a dict of counters
+    describing the amount of work done.
+    """
+    padded_distances, padded_state = pad_volume(distances, state)
+    flat_distances = padded_distances.reshape(-1)
+    flat_state = padded_state.reshape(-1)
+
+    if flooding_directions == "FAST_MARCHING":
+        # Fast marching has its own (priority queue) order of settling the cells
+        counters = propagate_fast_marching(flat_distances, flat_state, flat_seeds(seeds, padded_distances.shape), padded_distances.shape, step_width, progress)
+        unpad_volume(padded_distances, padded_state, distances, state)
+        return counters
+
+    offsets = flat_offsets(chamfer_neighbours(flooding_directions), padded_distances.shape, step_width)
+    if propagation_methode == "SWEEP":
+        counters = propagate_sweep(
+            padded_distances, padded_state, flat_seeds(seeds, padded_distances.shape),
+            weigh_neighbours(chamfer_neighbours(flooding_directions), step_width), progress
+        )
+    elif propagation_methode == "FIFO":
+        counters = propagate_fifo(flat_distances, flat_state, flat_seeds(seeds, padded_distances.shape), offsets, progress)
+    else:
+        counters = propagate_dijkstra(flat_distances, flat_state, flat_seeds(seeds, padded_distances.shape), offsets, progress)
+
+    unpad_volume(padded_distances, padded_state, distances, state)
+    return counters
+
+
+def seed(cell, distances, state, counters):
+    """Sets a seed cell to 0 and returns whether it needs to be propagated"""
+    if state[cell] == BORDER:
+        return False
+    if state[cell] != FREE:
+        distances[cell] = 0.0
+        state[cell] = INSIDE_WALL
+        return False
+    if distances[cell] == float("inf"):
+        counters["reached"] += 1
+    distances[cell] = 0.0
+    return True
+
+
+def new_counters():
+    return collections.OrderedDict([("reached", 0), ("pushes", 0), ("pops", 0), ("outdated_pops", 0), ("relaxations", 0), ("re_relaxations", 0)])
+
+
+def propagate_fifo(distances, state, seeds, offsets, progress):
+    """Breadth-first flooding, which re-enqueues a cell whenever a shorter distance to it is found"""
+    # Memoryviews allow for fast scalar access from within the interpreter loop (and write through to the arrays)
+    distances = memoryview(distances)
+    state = memoryview(state)
+    counters = new_counters()
+    infinity = float("inf")
+
+    cells_to_check = collections.deque(cell for cell in seeds if seed(cell, distances, state, counters))
+    counters["pushes"] = len(cells_to_check)
+    while len(cells_to_check) > 0:
+        cell = cells_to_check.popleft()
+        counters["pops"] += 1
+        current_value = distances[cell]
+        for offset, weight in offsets:
+            neighbour = cell + offset
+            neighbour_state = state[neighbour]
+            if neighbour_state == BORDER:
+                continue
+            value = current_value + weight
+            previous_value = distances[neighbour]
+            if value >= previous_value:
+                continue
+            distances[neighbour] = value
+            if neighbour_state != FREE:
+                state[neighbour] = INSIDE_WALL
+                continue
+            # Compare at the storage precision; otherwise, rounding would re-enqueue cells with the very same distance
+            if distances[neighbour] >= previous_value:
+                continue
+            counters["relaxations"] += 1
+            if previous_value == infinity:
+                counters["reached"] += 1
+                if progress is not None and counters["reached"] % 1024 == 0:
+                    progress(counters["reached"])
+            else:
+                counters["re_relaxations"] += 1
+            cells_to_check.append(neighbour)
+            counters["pushes"] += 1
+    return counters
+
+
+def propagate_dijkstra(distances, state, seeds, offsets, progress):
+    """Flooding in order of increasing distance, so that every free cell is settled exactly once"""
+    distances = memoryview(distances)
+    state = memoryview(state)
+    counters = new_counters()
+    infinity = float("inf")
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+
+    heap = [(0.0, cell) for cell in seeds if seed(cell, distances, state, counters)]
+    heapq.heapify(heap)
+    counters["pushes"] = len(heap)
+    while len(heap) > 0:
+        current_value, cell = heappop(heap)
+        counters["pops"] += 1
+        if current_value > distances[cell]:
+            # Outdated entry of a cell that has been settled with a shorter distance already
+            counters["outdated_pops"] += 1
+            continue
+        for offset, weight in offsets:
+            neighbour = cell + offset
+            neighbour_state = state[neighbour]
+            if neighbour_state == BORDER:
+                continue
+            value = current_value + weight
+            previous_value = distances[neighbour]
+            if value >= previous_value:
+                continue
+            distances[neighbour] = value
+            if neighbour_state != FREE:
+                state[neighbour] = INSIDE_WALL
+                continue
+            value = distances[neighbour]
+            if value >= previous_value:
+                continue
+            counters["relaxations"] += 1
+            if previous_value == infinity:
+                counters["reached"] += 1
+                if progress is not None and counters["reached"] % 1024 == 0:
+                    progress(counters["reached"])
+            else:
+                counters["re_relaxations"] += 1
+            heappush(heap, (value, neighbour))
+            counters["pushes"] += 1
+    return counters
+
+
+def initialize_fast_marching(distances, state, seeds, axes, step_widths):
+    """Returns (distance, cell) entries for the cells within PADDING cells of the seeds, set to their exact distance.
+
+    Without this, the first-order error right at the seeds would spread over the whole volume. Only cells whose
+    bounding box with the seed is entirely free are initialized, so that the distances never leak through walls.
+    """
+    entries = []
+    steps = range(-PADDING, PADDING + 1)
+    for cell in seeds:
+        for dx, dy, dz in itertools.product(steps, steps, steps):
+            neighbour = cell + dx * axes[0] + dy * axes[1] + dz * axes[2]
+            box = itertools.product(
+                range(min(0, dx), max(0, dx) + 1), range(min(0, dy), max(0, dy) + 1), range(min(0, dz), max(0, dz) + 1)
+            )
+            if any(state[cell + x * axes[0] + y * axes[1] + z * axes[2]] != FREE for x, y, z in box):
+                continue
+            value = math.sqrt((dx * step_widths[0]) ** 2 + (dy * step_widths[1]) ** 2 + (dz * step_widths[2]) ** 2)
+            if value < distances[neighbour]:
+                distances[neighbour] = value
+                entries.append((distances[neighbour], neighbour))
+    return entries
+
+
+def propagate_fast_marching(distances, state, seeds, padded_shape, step_width, progress):
+    """Fast marching method, solving the Eikonal equation |∇d| = 1 with second-order upwind differences where available.
+
+    (See: James A. Sethian. "Level Set Methods and Fast Marching Methods", Section 8.6, 1999.)
+    """
+    distances = memoryview(distances)
+    state = memoryview(state)
+    counters = new_counters()
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+    step_widths = axis_step_widths(step_width)
+    axes = (1, padded_shape[2], padded_shape[1] * padded_shape[2])
+    # The differences along each axis are divided by its step width, i. e., their weights by its square
+    axis_weights = [(axis, 1.0 / (step * step)) for axis, step in zip(axes, step_widths)]
+    neighbour_offsets = [(direction * axis, step) for axis, step in zip(axes, step_widths) for direction in (-1, 1)]
+    # Settled cells; the padding of two cells allows for second-order differences without bounds checks
+    known = bytearray(len(distances))
+
+    heap = [(0.0, cell) for cell in seeds if seed(cell, distances, state, counters)]
+    heap += initialize_fast_marching(distances, state, [cell for _, cell in heap], axes, step_widths)
+    heapq.heapify(heap)
+    counters["pushes"] = len(heap)
+    while len(heap) > 0:
+        current_value, cell = heappop(heap)
+        counters["pops"] += 1
+        if known[cell] or current_value > distances[cell]:
+            counters["outdated_pops"] += 1
+            continue
+        known[cell] = 1
+        if current_value > 0.0:
+            counters["reached"] += 1
+            if progress is not None and counters["reached"] % 1024 == 0:
+                progress(counters["reached"])
+
+        for neighbour_offset, step in neighbour_offsets:
+            neighbour = cell + neighbour_offset
+            neighbour_state = state[neighbour]
+            if neighbour_state == BORDER or known[neighbour]:
+                continue
+            previous_value = distances[neighbour]
+            if neighbour_state != FREE:
+                if current_value + step < previous_value:
+                    distances[neighbour] = current_value + step
+                    state[neighbour] = INSIDE_WALL
+                continue
+
+            # Per axis, the upwind difference uses the smaller of the two settled neighbors (and the next cell beyond it
+            # for second order); the result is the solution of sum(alpha / step_width^2 * (value - beta)^2) = 1
+            terms = []
+            for axis, axis_weight in axis_weights:
+                best = None
+                for upwind in (neighbour - axis, neighbour + axis):
+                    if known[upwind] and (best is None or distances[upwind] < distances[best]):
+                        best = upwind
+                if best is None:
+                    continue
+                first = distances[best]
+                beyond = best + (best - neighbour)
+                if known[beyond] and distances[beyond] <= first:
+                    terms.append(((4.0 * first - distances[beyond]) / 3.0, 2.25 * axis_weight))
+                else:
+                    terms.append((first, axis_weight))
+            terms.sort()
+
+            value = float("inf")
+            a = b = c = 0.0
+            for beta, alpha in terms:
+                if beta >= value:
+                    break
+                a += alpha
+                b += alpha * beta
+                c += alpha * beta * beta
+                discriminant = b * b - a * (c - 1.0)
+                if discriminant < 0.0:
+                    break
+                value = (b + math.sqrt(discriminant)) / a
+
+            if value >= previous_value:
+                continue
+            distances[neighbour] = value
+            if distances[neighbour] >= previous_value:
+                continue
+            counters["relaxations"] += 1
+            if previous_value != float("inf"):
+                counters["re_relaxations"] += 1
+            heappush(heap, (distances[neighbour], neighbour))
+            counters["pushes"] += 1
+    return counters
+
+
+def free_run_lengths(free, direction):
+    """Returns the number of consecutive free cells along x that end at each cell, counted in the given direction"""
+    index = numpy.arange(free.shape[-1])
+    if direction < 0:
+        free = free[..., ::-1]
+    last_blocked = numpy.maximum.accumulate(numpy.where(free, -1, index), axis=-1)
+    lengths = numpy.where(free, index - last_blocked, 0)
+    if direction < 0:
+        lengths = lengths[..., ::-1]
+    return lengths
+
+
+def sweep_row(row, shift_masks, weight, direction):
+    """Propagates the distances along a row of free cells in the given direction (log-step parallel prefix minimum).
+
+    shift_masks[k] tells for each cell whether the 2^k cells preceding it in the given direction are free as well.
+    """
+    shift = 1
+    for valid in shift_masks:
+        if direction > 0:
+            numpy.minimum(row[shift:], row[:-shift] + shift * weight, out=row[shift:], where=valid[shift:])
+        else:
+            numpy.minimum(row[:-shift], row[shift:] + shift * weight, out=row[:-shift], where=valid[:-shift])
+        shift *= 2
+
+
+def sweep(distances, free, neighbours, direction, changed_before, counters):
+    """One raster pass over the padded volume, either forward (direction 1) or backward (direction -1).
+
+    Slabs are skipped if neither they nor a slab within reach of the neighbourhood changed since the previous pass.
+    Returns which slabs changed.
+    """
+    depth, height, width = distances.shape
+    inner_y = slice(PADDING, height - PADDING)
+    inner_x = slice(PADDING, width - PADDING)
+
+    # The neighbours in the already visited slabs, rows and cells of the current row, respectively
+    def precedes(offset):
+        dx, dy, dz = offset
+        return (dz, dy, dx) < (0, 0, 0) if direction > 0 else (dz, dy, dx) > (0, 0, 0)
+    slab_neighbours = [(dx, dy, dz, weight) for dx, dy, dz, weight in neighbours if dz != 0 and precedes((dx, dy, dz))]
+    row_neighbours = [(dx, dy, weight) for dx, dy, dz, weight in neighbours if dz == 0 and dy != 0 and precedes((dx, dy, dz))]
+    cell_weight = [weight for dx, dy, dz, weight in neighbours if (dy, dz) == (0, 0) and dx == -direction][0]
+    run_lengths = free_run_lengths(free, direction)
+    tolerance = min(weight for dx, dy, dz, weight in neighbours) * 1e-6
+
+    slabs = range(PADDING, depth - PADDING)
+    rows = range(PADDING, height - PADDING)
+    if direction < 0:
+        slabs = reversed(slabs)
+        rows = list(reversed(rows))
+    changed = numpy.zeros(depth, dtype=bool)
+    for z in slabs:
+        window = slice(z - PADDING, z + PADDING + 1)
+        if not (changed_before[window].any() or changed[window].any()):
+            continue
+        slab = distances[z, inner_y, inner_x]
+        slab_free = free[z, inner_y, inner_x]
+        previous_slab = slab.copy()
+        for dx, dy, dz, weight in slab_neighbours:
+            candidates = distances[z + dz, PADDING + dy:height - PADDING + dy, PADDING + dx:width - PADDING + dx] + weight
+            numpy.minimum(slab, candidates, out=slab, where=slab_free)
+
+        longest_run = run_lengths[z].max()
+        shift_masks = []
+        shift = 1
+        while shift < longest_run:
+            shift_masks.append(run_lengths[z] > shift)
+            shift *= 2
+        rows_with_free_cells = slab_free.any(axis=1)
+        for y in rows:
+            if not rows_with_free_cells[y - PADDING]:
+                continue
+            row = distances[z, y, inner_x]
+            row_free = free[z, y, inner_x]
+            for dx, dy, weight in row_neighbours:
+                candidates = distances[z, y + dy, PADDING + dx:width - PADDING + dx] + weight
+                numpy.minimum(row, candidates, out=row, where=row_free)
+            sweep_row(distances[z, y], [mask[y] for mask in shift_masks], cell_weight, direction)
+        # Improvements by mere rounding differences (the scan multiplies where the other passes add) are ignored, as they
+        # would otherwise keep bouncing between the passes for many iterations
+        updated_cells = int(numpy.count_nonzero(slab < previous_slab - tolerance))
+        changed[z] = updated_cells > 0
+        counters["updated_cells"] += updated_cells
+    return changed
+
+
+def propagate_sweep(distances, state, seeds, neighbours, progress = None):
+    """Raster-sweep chamfer distance transform (forward and backward passes, repeated until nothing changes).
+
+    Yields the same distances as the queue-based methodes, since all of them relax the same neighbourhood until
+    convergence; only the order differs. Expects padded volumes, flat seed indices and weighted neighbours.
+    """
+    counters = collections.OrderedDict([("reached", 0), ("iterations", 0), ("updated_cells", 0)])
+    free = state == FREE
+    working_distances = numpy.full(distances.shape, numpy.inf)
+    flat_working_distances = working_distances.reshape(-1)
+    flat_state = state.reshape(-1)
+    for cell in seeds:
+        seed(cell, flat_working_distances, flat_state, counters)
+    # Seeds within walls must not be propagated; keep them aside
+    wall_distances = numpy.where(free, numpy.inf, working_distances)
+    working_distances[~free] = numpy.inf
+
+    changed = numpy.ones(distances.shape[0], dtype=bool)
+    while True:
+        changed_forward = sweep(working_distances, free, neighbours, 1, changed, counters)
+        changed = sweep(working_distances, free, neighbours, -1, changed_forward, counters)
+        counters["iterations"] += 1
+        if progress is not None:
+            progress(int(numpy.count_nonzero(numpy.isfinite(working_distances))))
+        if not changed_forward.any() and not changed.any():
+            break
+
+    # Cells within walls receive the smallest distance of their free neighbours
+    depth, height, width = distances.shape
+    inner = (slice(PADDING, depth - PADDING), slice(PADDING, height - PADDING), slice(PADDING, width - PADDING))
+    for dx, dy, dz, weight in neighbours:
+        shifted = working_distances[PADDING + dz:depth - PADDING + dz, PADDING + dy:height - PADDING + dy, PADDING + dx:width - PADDING + dx]
+        numpy.minimum(wall_distances[inner], shifted + weight, out=wall_distances[inner])
+    walls = (state != FREE) & (state != BORDER) & numpy.isfinite(wall_distances)
+    working_distances[walls] = wall_distances[walls]
+    state[walls] = INSIDE_WALL
+
+    distances[...] = working_distances
+    counters["reached"] = int(numpy.count_nonzero(free & numpy.isfinite(working_distances)))
+    return counters
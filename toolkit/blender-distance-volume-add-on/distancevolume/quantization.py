@@ -0,0 +1,108 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json, os, tempfile, numpy
+from PIL import Image
+
+from . mipmap import get_mip_name
+from . texture import get_max_distance, layout_slices, normalize_distances
+from . volume import OCCLUDED
+
+# The sidecar records the scale and offset of each exported volume, i. e., distance = offset + value * scale, and the
+# resolution of mip levels
+QUANTIZATION_NAME = "quantization.json"
+QUANTIZATION_VERSION = 1
+
+
+def quantize_distances(distances, state, bounding_box, bits = None, max_range = 0.0, visualize_occlusion = False, value_range = None):
+    """Returns the distances as uint16 values ([z][y][x]) and their quantization.
+
+    Without bits, the distances are normalized by the largest bounding box dimension (as by encode_texture). Otherwise,
+    the range of the reached distances (limited to max_range, if given) is quantized to the given number of bits. The
+    codes are stored in the upper bits of the uint16 values, so that 16-bit decoding works the same for all bit depths,
+    and an 8-bit volume is fully described by its higher bits. Unreached cells and distances beyond the range are
+    encoded as the largest value. value_range optionally fixes the quantized range to the (offset, maxDistance) of
+    another volume, e.g., for its mip levels.
+    """
+    reached = numpy.isfinite(distances)
+    if bits is None:
+        bits = 16
+        values = normalize_distances(distances, state, bounding_box, visualize_occlusion).astype(numpy.uint16)
+        scale = get_max_distance(bounding_box) / 65535
+        offset = 0.0
+        top = get_max_distance(bounding_box)
+    else:
+        if value_range is not None:
+            offset, top = value_range
+        else:
+            offset = float(distances[reached].min()) if reached.any() else 0.0
+            top = float(distances[reached].max()) if reached.any() else 0.0
+            if max_range > 0.0:
+                top = min(top, offset + max_range)
+        if top <= offset:
+            # All reached cells share one distance; any non-zero span keeps the recorded range consistent with the codes
+            top = offset + 1.0
+        levels = (1 << bits) - 1
+        shift = 16 - bits
+        code_scale = (top - offset) / levels
+        codes = numpy.rint((numpy.clip(numpy.where(reached, distances, top), offset, top) - offset) / code_scale)
+        codes[~reached] = levels
+        if visualize_occlusion:
+            codes[state == OCCLUDED] = 0
+        values = numpy.left_shift(codes.astype(numpy.uint16), shift)
+        scale = code_scale / (1 << shift)
+
+    # The error is measured for the reached cells within the range; the ones beyond are saturated by design
+    within = reached & (distances <= top)
+    if visualize_occlusion:
+        within &= state != OCCLUDED
+    max_error = float(numpy.abs(offset + values[within] * scale - distances[within]).max()) if within.any() else 0.0
+    return values, {"bits": bits, "scale": scale, "offset": offset, "maxDistance": top, "maxError": max_error}
+
+
+def save_quantized_texture(filepath, values, bits):
+    """Saves quantized values as <filepath>_high.png and, for more than 8 bits, <filepath>_low.png"""
+    data = layout_slices(values)
+    Image.fromarray(numpy.right_shift(data, 8).astype(numpy.uint8), "L").save("{0}_high.png".format(filepath))
+    if bits > 8:
+        Image.fromarray(numpy.bitwise_and(data, 0xFF).astype(numpy.uint8), "L").save("{0}_low.png".format(filepath))
+    elif os.path.isfile("{0}_low.png".format(filepath)):
+        # Do not leave the lower bits of a previous export around, as they would be combined with the new higher bits
+        os.remove("{0}_low.png".format(filepath))
+
+
+def get_quantized_files(name, bits, mip_levels = 0):
+    names = [name] + [get_mip_name(name, level) for level in range(1, mip_levels + 1)]
+    if bits is not None and bits <= 8:
+        return [name + "_high.png" for name in names]
+    return [name + suffix for name in names for suffix in ("_low.png", "_high.png")]
+
+
+def load_quantization(output_path):
+    """Returns the quantizations recorded in the sidecar of the output directory (empty if there is none or it is outdated)"""
+    try:
+        with open(os.path.join(output_path, QUANTIZATION_NAME), encoding="utf-8") as quantization_file:
+            sidecar = json.load(quantization_file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(sidecar, dict) or sidecar.get("version") != QUANTIZATION_VERSION:
+        return {}
+    return sidecar.get("volumes", {})
+
+
+def save_quantization(output_path, volumes):
+    os.makedirs(output_path, exist_ok=True)
+    descriptor, temporary_file = tempfile.mkstemp(suffix=".tmp", dir=output_path)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as quantization_file:
+        json.dump({"version": QUANTIZATION_VERSION, "volumes": volumes}, quantization_file, indent=4, sort_keys=True)
+    os.replace(temporary_file, os.path.join(output_path, QUANTIZATION_NAME))
@@ -0,0 +1,261 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib, numpy
+
+NO_TRIANGLE = -1
+# Number of texels tested at once; triangles of similar size are rasterized together in blocks of about this size
+RASTER_BLOCK_SIZE = 1 << 20
+# Texels on (or numerically next to) an edge are covered by the triangle
+EDGE_TOLERANCE = 1e-9
+# The margin is grown ring by ring from each texel’s 8 neighbours
+DILATION_OFFSETS = [(y, x) for y in (-1, 0, 1) for x in (-1, 0, 1) if (y, x) != (0, 0)]
+
+# The texel positions of the most recently rasterized UV layout (see get_cached_texel_positions)
+texel_position_cache = {}
+
+
+def get_texel_bounds(uvs, width, height):
+    """Returns the smallest and largest texel (x, y) of each triangle’s bounding box, clamped to the texture; texel (x, y)
+    samples the UV coordinates (x / width, y / height).
+    """
+    scaled = uvs * (width, height)
+    low = numpy.ceil(scaled.min(axis=1) - EDGE_TOLERANCE).astype(numpy.int64)
+    high = numpy.floor(scaled.max(axis=1) + EDGE_TOLERANCE).astype(numpy.int64)
+    return numpy.maximum(low, 0), numpy.minimum(high, (width - 1, height - 1))
+
+
+def get_raster_batches(sizes):
+    """Yields the indices of triangles of similar size whose padded bounding boxes (their largest extent along x and y)
+    fit into a raster block, unless a single one is larger, and that extent
+    """
+    sides = sizes.max(axis=1)
+    order = numpy.argsort(sides, kind="stable")
+    areas = sides[order].astype(numpy.int64) ** 2
+    start = 0
+    while start < len(order):
+        window = areas[start:start + max(RASTER_BLOCK_SIZE // areas[start], 1)]
+        exceeds = numpy.arange(1, len(window) + 1) * window > RASTER_BLOCK_SIZE
+        count = max(int(numpy.argmax(exceeds)) if exceeds.any() else len(window), 1)
+        batch = order[start:start + count]
+        yield batch, sizes[batch].max(axis=0)
+        start += count
+
+
+def get_barycentric_weights(corners, x, y):
+    """Returns the barycentric weights (…, 3) of the texels (x, y) within the triangles given by their corners in texel
+    space (batch, 3, 2), broadcast over the texel grid
+    """
+    a, b, c = [corners[:, index, None, None, :] for index in range(0, 3)]
+    v0 = b - a
+    v1 = c - a
+    px = x - a[..., 0]
+    py = y - a[..., 1]
+    denominator = v0[..., 0] * v1[..., 1] - v1[..., 0] * v0[..., 1]
+    weight_b = (px * v1[..., 1] - v1[..., 0] * py) / denominator
+    weight_c = (v0[..., 0] * py - px * v0[..., 1]) / denominator
+    return numpy.stack([1.0 - weight_b - weight_c, weight_b, weight_c], axis=-1)
+
+
+def update_texels(priorities, triangles, weights, texels, priority, triangle, weight):
+    """Assigns the texels to the triangles whose priority is lower than the one recorded so far"""
+    # Of several hits of the same texel, the last one (i. e., the one with the lowest priority) is assigned
+    order = numpy.argsort(-priority, kind="stable")
+    texels, priority, triangle, weight = texels[order], priority[order], triangle[order], weight[order]
+    better = priority < priorities[texels]
+    texels = texels[better]
+    priorities[texels] = priority[better]
+    triangles[texels] = triangle[better]
+    weights[texels] = weight[better]
+
+
+def rasterize_triangles(uvs, width, height, progress = None):
+    """Rasterizes the triangles given by their UV coordinates (n, 3, 2) into a texture of the given size.
+
+    Returns the index of the triangle covering each texel ((height, width), NO_TRIANGLE for none) and the barycentric
+    weights of the texel within that triangle ((height, width, 3)). Overlapping triangles are resolved in favor of the
+    last one. progress receives the number of rasterized triangles.
+    """
+    uvs = numpy.asarray(uvs, dtype=numpy.float64).reshape(-1, 3, 2)
+    texel_count = width * height
+    priorities = numpy.full(texel_count, numpy.inf)
+    triangles = numpy.full(texel_count, NO_TRIANGLE, dtype=numpy.int32)
+    weights = numpy.zeros((texel_count, 3), dtype=numpy.float32)
+
+    corners = uvs * (width, height)
+    doubled_areas = numpy.abs(
+        (corners[:, 1, 0] - corners[:, 0, 0]) * (corners[:, 2, 1] - corners[:, 0, 1])
+        - (corners[:, 2, 0] - corners[:, 0, 0]) * (corners[:, 1, 1] - corners[:, 0, 1])
+    )
+    low, high = get_texel_bounds(uvs, width, height)
+    sizes = high - low + 1
+    candidates = numpy.flatnonzero((sizes > 0).all(axis=1) & (doubled_areas > EDGE_TOLERANCE))
+
+    rasterized = len(uvs) - len(candidates)
+    for batch, extent in get_raster_batches(sizes[candidates]):
+        batch = candidates[batch]
+        x = low[batch, 0, None, None] + numpy.arange(0, extent[0])[None, None, :]
+        # Triangles larger than a raster block are rasterized in tiles of rows
+        tile_rows = max(RASTER_BLOCK_SIZE // (len(batch) * extent[0]), 1)
+        for row in range(0, extent[1], tile_rows):
+            y = low[batch, 1, None, None] + numpy.arange(row, min(row + tile_rows, extent[1]))[None, :, None]
+            in_bounds = (x <= high[batch, 0, None, None]) & (y <= high[batch, 1, None, None])
+            batch_weights = get_barycentric_weights(corners[batch], x, y)
+            inside = in_bounds & (batch_weights >= -EDGE_TOLERANCE).all(axis=-1)
+            texels = numpy.broadcast_to(y * width + x, inside.shape)
+            indices = numpy.broadcast_to(batch[:, None, None], inside.shape)
+
+            # Later triangles take precedence over earlier ones
+            update_texels(
+                priorities, triangles, weights, texels[inside], -1.0 - indices[inside], indices[inside], batch_weights[inside]
+            )
+        rasterized += len(batch)
+        if progress is not None:
+            progress(rasterized)
+
+    return triangles.reshape(height, width), weights.reshape(height, width, 3)
+
+
+def grow_mask(mask, rings):
+    """Returns the mask grown by the given number of texels along both axes and the diagonals"""
+    grown = mask.copy()
+    for ring in range(0, rings):
+        grown[:, 1:] |= grown[:, :-1].copy()
+        grown[:, :-1] |= grown[:, 1:].copy()
+    for ring in range(0, rings):
+        grown[1:, :] |= grown[:-1, :].copy()
+        grown[:-1, :] |= grown[1:, :].copy()
+    return grown
+
+
+def dilate_texels(triangles, weights, margin):
+    """Returns the rasterized triangles and weights (see rasterize_triangles) extended by the margin (in texels).
+
+    Each empty texel within the margin receives the triangle and weights of its nearest covered texel, so that the
+    margins of neighbouring UV islands meet halfway instead of bleeding into each other. The nearest texels are
+    propagated ring by ring (an approximate Euclidean distance transform) within the band around the covered texels, so
+    the cost depends on the texture size and the margin, but not on the number of triangles.
+    """
+    height, width = triangles.shape
+    if margin <= 0:
+        return triangles, weights
+
+    # The texels are padded by one empty texel on each side, so that the neighbours of the band are always valid
+    covered = numpy.pad(triangles != NO_TRIANGLE, 1, "constant")
+    band = grow_mask(covered, margin)
+    band[[0, -1], :] = False
+    band[:, [0, -1]] = False
+    texels = numpy.flatnonzero(band & ~covered)
+
+    rows, columns = numpy.indices(covered.shape, dtype=numpy.int32)
+    source_rows = numpy.where(covered, rows, -1).ravel()
+    source_columns = numpy.where(covered, columns, -1).ravel()
+    texel_rows = rows.ravel()[texels]
+    texel_columns = columns.ravel()[texels]
+    unreached = numpy.iinfo(numpy.int32).max
+    squared_distances = numpy.full(len(texels), unreached, dtype=numpy.int32)
+    neighbour_offsets = numpy.array([offset_y * (width + 2) + offset_x for offset_y, offset_x in DILATION_OFFSETS])
+
+    # Only the texels next to the ones that received a (nearer) source in the previous ring are updated
+    changed = covered.ravel()
+    for ring in range(0, margin):
+        active = numpy.flatnonzero(grow_mask(changed.reshape(covered.shape), 1).ravel()[texels])
+        if len(active) == 0:
+            break
+        changed = numpy.zeros(covered.size, dtype=bool)
+        for start in range(0, len(active), RASTER_BLOCK_SIZE):
+            chunk = active[start:start + RASTER_BLOCK_SIZE]
+            neighbours = texels[chunk] + neighbour_offsets[:, None]
+            neighbour_rows = source_rows[neighbours]
+            neighbour_columns = source_columns[neighbours]
+            candidate_distances = (texel_rows[chunk] - neighbour_rows) ** 2 + (texel_columns[chunk] - neighbour_columns) ** 2
+            candidate_distances[neighbour_rows < 0] = unreached
+            nearest = candidate_distances.argmin(axis=0)
+            columns_of_chunk = numpy.arange(0, len(chunk))
+            nearest_distances = candidate_distances[nearest, columns_of_chunk]
+            better = nearest_distances < squared_distances[chunk]
+            updated = chunk[better]
+            source_rows[texels[updated]] = neighbour_rows[nearest[better], columns_of_chunk[better]]
+            source_columns[texels[updated]] = neighbour_columns[nearest[better], columns_of_chunk[better]]
+            squared_distances[updated] = nearest_distances[better]
+            changed[texels[updated]] = True
+
+    # The rings reach up to margin texels along the diagonals; only the ones within the (round) margin are kept
+    texels = texels[squared_distances <= margin * margin]
+    sources = source_rows[texels] * (width + 2) + source_columns[texels]
+    dilated_triangles = numpy.pad(triangles, 1, "constant", constant_values=NO_TRIANGLE).ravel()
+    dilated_weights = numpy.pad(weights, ((1, 1), (1, 1), (0, 0)), "constant").reshape(-1, 3)
+    dilated_triangles[texels] = dilated_triangles[sources]
+    dilated_weights[texels] = dilated_weights[sources]
+    return (
+        dilated_triangles.reshape(height + 2, width + 2)[1:-1, 1:-1].copy(),
+        dilated_weights.reshape(height + 2, width + 2, 3)[1:-1, 1:-1].copy()
+    )
+
+
+def interpolate_texels(triangles, weights, values, chunk_size = RASTER_BLOCK_SIZE):
+    """Returns the values given per triangle corner (n, 3, k) interpolated at each texel ((height, width, k), zero for
+    texels without a triangle), e.g., the world positions of the texels
+    """
+    values = numpy.asarray(values)
+    flat_triangles = triangles.ravel()
+    flat_weights = weights.reshape(-1, 3)
+    result = numpy.zeros((len(flat_triangles), values.shape[-1]), dtype=numpy.float32)
+    for start in range(0, len(flat_triangles), chunk_size):
+        chunk = flat_triangles[start:start + chunk_size]
+        covered = numpy.flatnonzero(chunk != NO_TRIANGLE)
+        result[start + covered] = numpy.einsum(
+            "ij,ijk->ik", flat_weights[start + covered], values[chunk[covered]]
+        )
+    return result.reshape(triangles.shape + (values.shape[-1],))
+
+
+def get_texel_positions(uvs, positions, width, height, margin = 0, progress = None):
+    """Returns the positions ((height, width, 3), e.g., in world space) of the texels of the triangles given by their UV
+    coordinates (n, 3, 2) and corner positions (n, 3, 3), extended by the margin (see dilate_texels), and which texels
+    are covered
+    """
+    triangles, weights = rasterize_triangles(uvs, width, height, progress)
+    triangles, weights = dilate_texels(triangles, weights, margin)
+    return interpolate_texels(triangles, weights, positions), triangles != NO_TRIANGLE
+
+
+def get_texel_positions_key(uvs, positions, width, height, margin):
+    key = hashlib.sha1()
+    key.update(numpy.ascontiguousarray(uvs, dtype=numpy.float64).tobytes())
+    key.update(numpy.ascontiguousarray(positions, dtype=numpy.float64).tobytes())
+    key.update(repr((width, height, margin)).encode("utf-8"))
+    return key.hexdigest()
+
+
+def get_cached_texel_positions(uvs, positions, width, height, margin = 0, progress = None):
+    """Like get_texel_positions, but reuses the texel positions of the previous call for the same triangles, texture size,
+    and margin, e.g., when only the sensors moved. Returns the positions, the covered texels, and whether they were
+    cached.
+    """
+    key = get_texel_positions_key(uvs, positions, width, height, margin)
+    if texel_position_cache.get("key") == key:
+        return texel_position_cache["positions"], texel_position_cache["covered"], True
+
+    # Only one layout is kept, since the positions of large textures take up hundreds of megabytes
+    texel_position_cache.clear()
+    texel_positions, covered = get_texel_positions(uvs, positions, width, height, margin, progress)
+    texel_position_cache.update(key=key, positions=texel_positions, covered=covered)
+    return texel_positions, covered, False
+
+
+def get_texel_distances(texel_positions, covered, point):
+    """Returns the distances ((height, width)) of the covered texels to the point, zero for the others"""
+    distances = numpy.zeros(covered.shape, dtype=numpy.float32)
+    distances[covered] = numpy.linalg.norm(texel_positions[covered] - numpy.asarray(point, dtype=numpy.float32), axis=-1)
+    return distances
@@ -0,0 +1,114 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json, numpy
+from PIL import Image
+
+from . volume import OCCLUDED, INSIDE_WALL
+
+
+def save_image(filepath, filetype, data, width, height):
+    # Similar to webgl-operate’s encode_uint32_to_rgba8 function
+    low_bits = numpy.bitwise_and(numpy.right_shift(numpy.asarray(data, numpy.uint16()).flatten(), 0), 0xFF)
+    high_bits = numpy.bitwise_and(numpy.right_shift(numpy.asarray(data, numpy.uint16()).flatten(), 8), 0xFF)
+    low_image = Image.frombytes('L', (width, height), numpy.asarray(low_bits, numpy.uint8(), order = 'C'))
+    high_image = Image.frombytes('L', (width, height), numpy.asarray(high_bits, numpy.uint8(), order = 'C'))
+    low_image.save("{0}_low.{1}".format(filepath, filetype))
+    high_image.save("{0}_high.{1}".format(filepath, filetype))
+
+
+def layout_slices(values):
+    # The slices along z are laid out next to each other, with the rows flipped to match the image’s orientation
+    resolution = values.shape[::-1]
+    return values.transpose(1, 0, 2)[::-1].reshape(resolution[1], resolution[0] * resolution[2])
+
+
+def get_max_distance(bounding_box):
+    return max([(bounding_box.max[i] - bounding_box.min[i]) for i in range(0, 3)])
+
+
+def normalize_distances(distances, state, bounding_box, visualize_occlusion = False):
+    """Returns the distances scaled to [0, 65535], normalized by the largest bounding box dimension"""
+    max_distance = get_max_distance(bounding_box)
+
+    # Unreached cells (free or within walls) are encoded as the maximum distance, values within walls by their
+    # absolute value
+    values = numpy.where(distances == numpy.inf, max_distance, distances)
+    if visualize_occlusion:
+        values[state == OCCLUDED] = 0.0
+    values = numpy.minimum(values, max_distance) / max_distance
+    return values * 65535
+
+
+def encode_texture(distances, state, bounding_box, visualize_occlusion = False):
+    """Returns the 16-bit texture data of a distance volume, normalized by the largest bounding box dimension"""
+    return layout_slices(normalize_distances(distances, state, bounding_box, visualize_occlusion))
+
+
+def save_texture(filepath, distances, state, bounding_box, visualize_occlusion = False):
+    """Saves a distance volume as <filepath>_low.png and <filepath>_high.png"""
+    data = encode_texture(distances, state, bounding_box, visualize_occlusion)
+    save_image(filepath, 'png', data, data.shape[1], data.shape[0])
+
+
+def save_nearest_textures(filepath, nearest_distances, nearest_sensors, bounding_box, sensor_names):
+    """Saves nearest sensor volumes as <filepath>_sensors.png (the sensor indices), <filepath>_low.png and
+    <filepath>_high.png (the 16-bit distances), each holding the nearest sensors in its RGBA channels, and
+    <filepath>.json, which maps the sensor indices to the sensor names.
+    """
+    max_distance = get_max_distance(bounding_box)
+    slots = nearest_distances.shape[0]
+    height, width = layout_slices(nearest_distances[0]).shape
+
+    # Unused channels are encoded like unreached cells, i. e., without a sensor and at the maximum distance
+    indices = numpy.full((height, width, 4), 255, dtype=numpy.uint8)
+    distances = numpy.full((height, width, 4), 65535, dtype=numpy.uint16)
+    for slot in range(0, slots):
+        indices[:, :, slot] = layout_slices(nearest_sensors[slot])
+        values = numpy.minimum(numpy.where(nearest_distances[slot] == numpy.inf, max_distance, nearest_distances[slot]), max_distance)
+        distances[:, :, slot] = layout_slices(values / max_distance * 65535)
+
+    Image.fromarray(indices, "RGBA").save("{0}_sensors.png".format(filepath))
+    Image.fromarray(numpy.bitwise_and(distances, 0xFF).astype(numpy.uint8), "RGBA").save("{0}_low.png".format(filepath))
+    Image.fromarray(numpy.right_shift(distances, 8).astype(numpy.uint8), "RGBA").save("{0}_high.png".format(filepath))
+    with open("{0}.json".format(filepath), "w", encoding="utf-8") as json_file:
+        json.dump({"nearestSensors": slots, "sensors": list(sensor_names)}, json_file, indent=4)
+
+
+def encode_preview(distances, state, axis = "ATLAS", slice_index = 0, show_occlusion = False):
+    """Returns the RGBA pixels of the preview texture of a distance volume, showing either all of its slices along z next
+    to each other (ATLAS) or only its slice at slice_index along the X, Y, or Z axis. With show_occlusion, the occluded
+    cells are highlighted in red.
+    """
+    resolution = distances.shape[::-1]
+
+    # Unreached cells are shown as 150 m away, values within walls are shown negated
+    values = numpy.where(distances == numpy.inf, 150.0, distances)
+    values = numpy.where(state == INSIDE_WALL, -values, values) / 150.0
+
+    if axis == "ATLAS":
+        # The slices along z are laid out next to each other, i. e., pixel (z * resolution[0] + x, y) holds cell [z][y][x]
+        values = values.transpose(1, 0, 2).reshape(resolution[1], -1)
+        state = state.transpose(1, 0, 2).reshape(resolution[1], -1)
+    else:
+        # The image’s columns and rows run along x and y for Z slices, x and z for Y slices, and y and z for X slices
+        dimension = {"X": 2, "Y": 1, "Z": 0}[axis]
+        slice_index = min(max(slice_index, 0), distances.shape[dimension] - 1)
+        values = numpy.take(values, slice_index, axis=dimension)
+        state = numpy.take(state, slice_index, axis=dimension)
+
+    pixels = numpy.ones(values.shape + (4,), dtype=numpy.float32)
+    pixels[:, :, 0:3] = values[:, :, None]
+    if show_occlusion:
+        pixels[state == OCCLUDED, 0:3] = (1.0, 0.0, 0.0)
+    return pixels
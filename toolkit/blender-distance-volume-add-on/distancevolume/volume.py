@@ -0,0 +1,32 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy
+
+# A distance volume consists of two dense arrays, both indexed as [z][y][x]:
+# - the distances (float32), which are infinite for cells that have not been reached (yet),
+# - the states (uint8), which tell free cells from cells lying within walls/obstacles.
+# Cells within walls never propagate distances; they only store the smallest distance of a free neighbor.
+FREE = 0
+OCCLUDED = 1
+INSIDE_WALL = 2
+
+
+def create_state(occluded):
+    """Returns the state array for a boolean mask of occluded cells"""
+    return numpy.where(occluded, OCCLUDED, FREE).astype(numpy.uint8)
+
+
+def create_distances(shape):
+    """Returns a distance array with all cells unreached"""
+    return numpy.full(shape, numpy.inf, dtype=numpy.float32)
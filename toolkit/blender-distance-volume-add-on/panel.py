@@ -50,8 +50,21 @@ class DistanceBakePanel(bpy.types.Panel):
             row = col.row()
             row.prop(properties, "flooding_directions", expand=True)
             row = col.row()
+            row.prop(properties, "propagation_methode", expand=True)
+            row = col.row()
+            row.prop(properties, "sensor_volume_layout", expand=True)
+            row = col.row()
+            row.enabled = properties.sensor_volume_layout == "NEAREST"
+            row.prop(properties, "nearest_sensor_count")
+            row = col.row()
+            row.prop(properties, "uv_sensor_layout", expand=True)
+            col.prop(properties, "margin")
+            row = col.row()
             row.prop(properties, "occlusion_methode", expand=True)
+            col.prop(properties, "use_occlusion_cache")
             col.prop(properties, "volume_resolution")
+            col.prop(properties, "vertical_resolution")
+            col.prop(properties, "bake_workers")
 
             col.prop_search(properties, "obstacles_collection", bpy.data, "collections")
             col.prop_search(properties, "sensor_collection", bpy.data, "collections")
@@ -62,6 +75,46 @@ class DistanceBakePanel(bpy.types.Panel):
             row = col.row()
             row.enabled = properties.output_methode == "PREVIEW" or properties.output_methode == "BOTH"
             row.prop_search(properties, "preview_texture", bpy.data, "images")
+            row = col.row()
+            row.enabled = properties.output_methode == "PREVIEW" or properties.output_methode == "BOTH"
+            if properties.sensor_collection in bpy.data.collections:
+                row.prop_search(properties, "preview_sensor", bpy.data.collections[properties.sensor_collection], "objects")
+            else:
+                row.prop(properties, "preview_sensor")
+            row = col.row()
+            row.enabled = properties.output_methode == "PREVIEW" or properties.output_methode == "BOTH"
+            row.prop(properties, "preview_axis", expand=True)
+            row = col.row()
+            row.enabled = (properties.output_methode == "PREVIEW" or properties.output_methode == "BOTH") and properties.preview_axis != "ATLAS"
+            row.prop(properties, "preview_slice")
+            row = col.row()
+            row.enabled = properties.output_methode == "PREVIEW" or properties.output_methode == "BOTH"
+            row.prop(properties, "preview_occlusion")
+            row = col.row()
+            row.enabled = properties.output_methode == "EXPORT" or properties.output_methode == "BOTH"
+            row.prop(properties, "output_path")
+            row = col.row()
+            row.enabled = properties.output_methode == "EXPORT" or properties.output_methode == "BOTH"
+            row.prop(properties, "export_format", expand=True)
+            row = col.row()
+            row.enabled = (properties.output_methode == "EXPORT" or properties.output_methode == "BOTH") and properties.export_format != "CONTAINER"
+            row.prop(properties, "mip_levels")
+            row = col.row()
+            row.enabled = (properties.output_methode == "EXPORT" or properties.output_methode == "BOTH") and properties.export_format != "PNG"
+            row.prop(properties, "use_container_bricks")
+            row.prop(properties, "container_brick_size")
+            row = col.row()
+            row.enabled = properties.output_methode == "EXPORT" or properties.output_methode == "BOTH"
+            row.prop(properties, "quantization")
+            row = col.row()
+            row.enabled = (properties.output_methode == "EXPORT" or properties.output_methode == "BOTH") and properties.quantization != "BOUNDING_BOX"
+            row.prop(properties, "quantization_range")
+            row = col.row()
+            row.enabled = properties.output_methode == "EXPORT" or properties.output_methode == "BOTH"
+            row.prop(properties, "export_occlusion_texture")
+            row = col.row()
+            row.enabled = properties.output_methode == "EXPORT" or properties.output_methode == "BOTH"
+            row.prop(properties, "incremental_bake")
 
         # Import Panel
         box = layout.box()
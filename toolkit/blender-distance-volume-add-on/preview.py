@@ -0,0 +1,121 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import bpy, collections, threading
+
+from . distancevolume import bake_distance_volume, encode_preview
+
+# Number of previewed distance volumes kept in memory, so that switching back and forth between sensors is instant
+PREVIEW_CACHE_VOLUMES = 4
+# Interval (in seconds) in which the sensors baked for the preview in the background are checked
+PREVIEW_BAKE_INTERVAL = 0.2
+
+# The occlusion, the sensors’ cells, and the most recently previewed distance volumes of the last bake, so that the
+# preview can switch sensors, slices, and overlays without baking again
+preview_cache = {"volumes": collections.OrderedDict()}
+# The sensors being baked for the preview, as {name: (thread, occlusion state, result list)}
+preview_bakes = {}
+
+
+def store_preview_bake(state, cells, step_widths, flooding_directions, propagation_methode):
+    """Replaces the cached bake, whose sensors (given as {name: cell}) are baked on demand when previewed"""
+    preview_cache.clear()
+    preview_cache.update(
+        volumes=collections.OrderedDict(), state=state, cells=cells, step_widths=step_widths,
+        flooding_directions=flooding_directions, propagation_methode=propagation_methode
+    )
+
+
+def store_preview_volume(name, distances, state):
+    volumes = preview_cache["volumes"]
+    volumes[name] = (distances, state)
+    volumes.move_to_end(name)
+    while len(volumes) > PREVIEW_CACHE_VOLUMES:
+        volumes.popitem(last=False)
+
+
+def bake_preview_volume(name):
+    """Bakes the named sensor of the cached bake in the background; check_preview_bakes shows it once it is done"""
+    if name in preview_bakes:
+        return
+    state = preview_cache["state"]
+    arguments = (
+        state, [preview_cache["cells"][name]], preview_cache["step_widths"],
+        preview_cache["flooding_directions"], preview_cache["propagation_methode"]
+    )
+    result = []
+
+    def bake():
+        distances, sensor_state, _ = bake_distance_volume(*arguments)
+        result.append((distances, sensor_state))
+
+    print("baking the preview of " + name)
+    thread = threading.Thread(target=bake, daemon=True)
+    preview_bakes[name] = (thread, state, result)
+    thread.start()
+    if not bpy.app.timers.is_registered(check_preview_bakes):
+        bpy.app.timers.register(check_preview_bakes, first_interval=PREVIEW_BAKE_INTERVAL)
+
+
+def check_preview_bakes():
+    """Stores the sensors baked for the preview and shows the selected one; runs as timer on Blender’s main thread"""
+    for name, (thread, state, result) in list(preview_bakes.items()):
+        if thread.is_alive():
+            continue
+        del preview_bakes[name]
+        # Volumes of an earlier bake (or of failed bakes) are dropped
+        if len(result) == 0 or preview_cache.get("state") is not state:
+            continue
+        store_preview_volume(name, *result[0])
+        settings = bpy.context.scene.distance_bake
+        if settings.preview_sensor == name:
+            update_preview(settings)
+    return PREVIEW_BAKE_INTERVAL if len(preview_bakes) > 0 else None
+
+
+def get_preview_volume(name):
+    """Returns the distances and state of the named sensor, or of the most recently previewed volume while the sensor
+    is baked in the background (or if the last bake does not know the sensor)
+    """
+    volumes = preview_cache["volumes"]
+    if name in volumes:
+        volumes.move_to_end(name)
+        return volumes[name]
+    if name in preview_cache.get("cells", {}):
+        bake_preview_volume(name)
+    if len(volumes) > 0:
+        return next(reversed(volumes.values()))
+    return None
+
+
+def get_preview_image(settings, width, height):
+    image_name = settings.preview_texture
+    image = bpy.data.images.get(image_name) if image_name != "" else None
+    if image is None or image.size[0] != width or image.size[1] != height:
+        image = bpy.data.images.new("VolumeTexture", width, height, float_buffer=True, is_data=True)
+        settings.preview_texture = image.name
+    return image
+
+
+def update_preview(settings):
+    """Shows the selected sensor, slice, and overlay of the cached bake in the preview texture"""
+    volume = get_preview_volume(settings.preview_sensor)
+    if volume is None:
+        return
+    pixels = encode_preview(volume[0], volume[1], settings.preview_axis, settings.preview_slice, settings.preview_occlusion)
+    image = get_preview_image(settings, pixels.shape[1], pixels.shape[0])
+    image.pixels.foreach_set(pixels.ravel())
+
+
+def update_preview_property(self, context):
+    update_preview(self)
@@ -13,6 +13,7 @@
 
 import bpy
 from bpy.props import PointerProperty, BoolProperty, IntProperty, FloatProperty, EnumProperty, StringProperty
+from . preview import update_preview_property
 
 class DistanceBakePropertyGroup(bpy.types.PropertyGroup):
     """Implements the properties for distance baking"""
@@ -33,7 +34,7 @@ class DistanceBakePropertyGroup(bpy.types.PropertyGroup):
 
     margin: IntProperty(
         name="Margin",
-        description="Extends the baked result",
+        description="Extends the baked UV islands by this number of texels, each taking the distance of the nearest texel of the nearest island",
         default=5,
         min=0,
         soft_max=15
@@ -50,6 +51,34 @@ class DistanceBakePropertyGroup(bpy.types.PropertyGroup):
         name="Preview Texture",
         description="Texture used for the preview"
     )
+    preview_sensor: StringProperty(
+        name="Preview Sensor",
+        description="Sensor shown in the preview (the first sensor if empty); other sensors of the last bake are baked on demand in the background",
+        update=update_preview_property
+    )
+    preview_axis: EnumProperty(
+        name="Preview Axis",
+        items=(
+            ("ATLAS", "Atlas", "Show all z slices side by side", 0),
+            ("X", "X", "Show a single slice along the x axis", 1),
+            ("Y", "Y", "Show a single slice along the y axis", 2),
+            ("Z", "Z", "Show a single slice along the z axis", 3)
+        ),
+        update=update_preview_property
+    )
+    preview_slice: IntProperty(
+        name="Preview Slice",
+        description="Index of the slice shown in the preview (clamped to the volume)",
+        default=0,
+        min=0,
+        update=update_preview_property
+    )
+    preview_occlusion: BoolProperty(
+        name="Show Occlusion",
+        description="Show occluded cells in red in the preview",
+        default=False,
+        update=update_preview_property
+    )
     obstacles_collection: StringProperty(
         name="Obstacles"
     )
@@ -61,7 +90,38 @@ class DistanceBakePropertyGroup(bpy.types.PropertyGroup):
         items=(
             ("STRAIGHT", "Straight", "Use only the direct neighbors of an voxel for flooding.", 0),
             ("DIAGONAL", "Diagonal (L2, 3×3)", "Use the direct and diagonal neighbors of a voxel for flooding.", 1),
-            ("DIAGONAL_5", "Diagonal (L2, 5×5)", "Use the direct, diagonal and next-direct/next-diagonal neighbors of a voxel for flooding.", 2)
+            ("DIAGONAL_5", "Diagonal (L2, 5×5)", "Use the direct, diagonal and next-direct/next-diagonal neighbors of a voxel for flooding.", 2),
+            ("FAST_MARCHING", "Fast Marching", "Solve the Eikonal equation for near-Euclidean geodesic distances around the obstacles (ignores the propagation setting).", 3)
+        )
+    )
+    propagation_methode: EnumProperty(
+        name="Propagation",
+        items=(
+            ("DIJKSTRA", "Priority Queue", "Flood the cells in order of increasing distance, so that every voxel is settled exactly once.", 0),
+            ("FIFO", "Queue (FIFO)", "Flood the cells breadth-first and re-enqueue them whenever a shorter distance is found.", 1),
+            ("SWEEP", "Raster Sweep", "Alternate vectorized forward and backward raster passes over the volume until the distances converge.", 2)
+        )
+    )
+    sensor_volume_layout: EnumProperty(
+        name="Sensor Volumes",
+        items=(
+            ("PER_SENSOR", "Per Sensor", "Bake and export one distance volume per sensor.", 0),
+            ("NEAREST", "Nearest Sensors", "Flood from all sensors at once and export the indices of and distances to the nearest sensors of each voxel as packed RGBA textures (nearest_sensors.png, nearest_low.png, nearest_high.png, and nearest.json).", 1)
+        )
+    )
+    nearest_sensor_count: IntProperty(
+        name="Nearest Sensors",
+        description="Number of nearest sensors recorded per voxel",
+        default=4,
+        min=1,
+        max=4
+    )
+    uv_sensor_layout: EnumProperty(
+        name="Distance Textures",
+        items=(
+            ("FIRST", "First Sensor", "Bake the distances to the first sensor (or to the 3D cursor) into the active texture.", 0),
+            ("PER_SENSOR", "Per Sensor", "Bake the distances to each sensor into an image of the active texture’s size, named <texture>_<sensor>.", 1),
+            ("CHANNELS", "Channels", "Bake the distances to four sensors each into the RGBA channels of images of the active texture’s size, named <texture>_sensors_<n>; their sensors property lists the sensors’ names.", 2)
         )
     )
     occlusion_methode: EnumProperty(
@@ -79,6 +139,71 @@ class DistanceBakePropertyGroup(bpy.types.PropertyGroup):
             ("BOTH", "Both", "", 2)
         )
     )
+    export_format: EnumProperty(
+        name="Export Format",
+        items=(
+            ("PNG", "PNG", "Export two 8-bit PNG images (higher and lower bits) per distance volume.", 0),
+            ("CONTAINER", "Container", "Export all distance volumes of the output directory into a single distance-volumes.rcdv file (16-bit values, deflate-compressed).", 1),
+            ("BOTH", "Both", "Export both the PNG images and the container.", 2)
+        )
+    )
+    mip_levels: IntProperty(
+        name="Mip Levels",
+        description="Number of additional PNG exports per distance volume, each at half the resolution of the previous one (<name>_mip1, <name>_mip2, …), for progressive loading; walls do not blur the distances of the free space",
+        default=0,
+        min=0,
+        max=8
+    )
+    use_container_bricks: BoolProperty(
+        name="Sparse Bricks",
+        description="Split the volumes of the container into bricks and omit the bricks whose cells all share the same distance, e.g., outside of the building or within solid walls",
+        default=False
+    )
+    container_brick_size: IntProperty(
+        name="Brick Size",
+        description="Number of cells along each axis of a brick",
+        default=8,
+        min=2,
+        soft_max=32
+    )
+    quantization: EnumProperty(
+        name="Quantization",
+        items=(
+            ("BOUNDING_BOX", "16-bit (Bounding Box)", "Normalize all distance volumes by the largest dimension of the bounding box.", 0),
+            ("RANGE_16", "16-bit", "Quantize the range of distances of each volume to 16 bits.", 1),
+            ("RANGE_12", "12-bit", "Quantize the range of distances of each volume to 12 bits (stored in the upper bits of the 16-bit textures).", 2),
+            ("RANGE_8", "8-bit", "Quantize the range of distances of each volume to 8 bits, which only requires the _high.png texture.", 3)
+        )
+    )
+    quantization_range: FloatProperty(
+        name="Quantization Range",
+        description="Largest distance above the nearest one that is quantized per volume (0: all reached distances); farther distances are clamped",
+        default=0.0,
+        min=0.0,
+        soft_max=50.0,
+        subtype="DISTANCE"
+    )
+    use_occlusion_cache: BoolProperty(
+        name="Cache Occlusion",
+        description="Reuse the occlusion volume of previous bakes with the same obstacles and settings, stored in the occlusion-cache directory next to the .blend file",
+        default=True
+    )
+    output_path: StringProperty(
+        name="Output Directory",
+        description="Directory the distance volume textures are exported to",
+        default="//",
+        subtype="DIR_PATH"
+    )
+    incremental_bake: BoolProperty(
+        name="Skip Unchanged Sensors",
+        description="Only re-export the sensors whose cell, obstacles, or bake settings changed since the last export to the output directory (as recorded in its bake-manifest.json file)",
+        default=True
+    )
+    export_occlusion_texture: BoolProperty(
+        name="Export Occlusion Texture",
+        description="Additionally export the occluded cells as debug__distances texture",
+        default=True
+    )
     volume_resolution: IntProperty(
         name="Volume Resolution",
         default=64,
@@ -86,6 +211,20 @@ class DistanceBakePropertyGroup(bpy.types.PropertyGroup):
         soft_min=8,
         soft_max=512
     )
+    vertical_resolution: IntProperty(
+        name="Vertical Resolution",
+        description="Number of cells along z (0: derived from the Volume Resolution, i.e., cubic cells); the distances account for the cells' actual extents along each axis",
+        default=0,
+        min=0,
+        soft_max=256
+    )
+    bake_workers: IntProperty(
+        name="Workers",
+        description="Number of processes baking the sensors' distance volumes in parallel (0: one per CPU core, 1: bake in Blender's own process)",
+        default=1,
+        min=0,
+        soft_max=32
+    )
     import_path: StringProperty(
         name="Import sensor positions from JSON file",
         description=""